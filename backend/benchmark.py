@@ -0,0 +1,522 @@
+"""Offline end-to-end benchmark for the repurposing pipeline.
+
+Runs the API in-process under uvicorn with Gemini replaced by a local fake
+model, generates a fixture for each content type, drives POST /repurpose at a
+fixed concurrency and reports throughput, latency percentiles and peak memory
+per content type. No network access or API key is needed.
+
+    python benchmark.py --types pdf,docx,txt --jobs 20 --concurrency 4
+    python benchmark.py --latency 1.5 --error-rate 0.05 --fake-rpm 60 --json report.json
+
+Every job gets a distinct fixture so the extraction, result and LLM response
+caches miss; pass --repeat-fixture to measure the cache-hit path instead.
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import types
+import wave
+import zlib
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+CONTENT_TYPES = ["pdf", "docx", "txt", "image", "audio", "video"]
+
+TOPICS = [
+    ("photosynthesis", "converts light energy into chemical energy stored in glucose"),
+    ("the water cycle", "moves water between oceans, atmosphere and land through evaporation and precipitation"),
+    ("Newton's second law", "states that force equals mass multiplied by acceleration"),
+    ("supply and demand", "determines market prices where the quantity supplied meets the quantity demanded"),
+    ("the French Revolution", "began in 1789 and reshaped ideas about citizenship and sovereignty"),
+    ("binary search", "finds an item in a sorted list by halving the search interval each step"),
+    ("cell division", "produces two daughter cells through mitosis or four through meiosis"),
+    ("plate tectonics", "explains earthquakes and mountain building through moving lithospheric plates"),
+]
+
+# Fake Gemini model
+
+class FakeGeminiModel:
+    """Stand-in for genai.GenerativeModel that answers every pipeline prompt locally.
+
+    Replies have the shape each caller parses (JSON for generation, translation and
+    frame batches, plain text for condensing and vision). latency is the mean reply
+    time in seconds, varied by +/- jitter (a fraction). error_rate injects failures,
+    and rpm > 0 answers calls beyond that many per minute with a 429 quota error,
+    like the real API does, so the rate limiter's retries are exercised.
+    """
+    model_name = "fake-gemini"
+
+    def __init__(self, latency: float = 0.5, jitter: float = 0.3, error_rate: float = 0.0,
+                 rpm: int = 0, seed: Optional[int] = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rpm = rpm
+        self.random = random.Random(seed)
+        self.recent_calls = deque()
+        self.calls = 0
+        self.errors = 0
+        self.rate_limited = 0
+
+    async def generate_content_async(self, contents: Any, generation_config: Optional[Dict] = None):
+        self.calls += 1
+        prompt = contents if isinstance(contents, str) else contents[0]
+        images = 0 if isinstance(contents, str) else len(contents) - 1
+
+        now = time.monotonic()
+        while self.recent_calls and now - self.recent_calls[0] > 60:
+            self.recent_calls.popleft()
+        if self.rpm and len(self.recent_calls) >= self.rpm:
+            self.rate_limited += 1
+            retry_in = 60 - (now - self.recent_calls[0])
+            raise RuntimeError(f"429 Quota exceeded for generate_content requests per minute, retry in {retry_in:.1f}s")
+        self.recent_calls.append(now)
+
+        await asyncio.sleep(max(0.0, self.latency * (1 + self.random.uniform(-self.jitter, self.jitter))))
+        if self.random.random() < self.error_rate:
+            self.errors += 1
+            raise RuntimeError("500 Internal error injected by the benchmark's fake model")
+
+        text = self.reply(prompt, images, generation_config)
+        tokens = (len(prompt) + len(text)) // 4 + images * 258
+        return types.SimpleNamespace(text=text, usage_metadata=types.SimpleNamespace(total_token_count=tokens))
+
+    def reply(self, prompt: str, images: int, generation_config: Optional[Dict]) -> str:
+        tag = format(zlib.crc32(prompt.encode()) % 10 ** 6, "06d")  # keeps replies for different inputs distinct
+        schema = (generation_config or {}).get("response_schema") or {}
+
+        if schema.get("type") == "array":
+            # Translation: echo every segment back, marked as translated
+            match = re.search(r"SEGMENTS: (\[.*?\])\n\nReply with", prompt, re.DOTALL)
+            language = re.search(r"culturally adapt these segments of educational content to (.+?) for", prompt)
+            segments = json.loads(match.group(1)) if match else []
+            prefix = f"[{language.group(1) if language else 'translated'}] "
+            return json.dumps([{"id": s["id"], "text": prefix + s["text"]} for s in segments], ensure_ascii=False)
+        if schema.get("type") == "object":
+            # Combined generation: only the sections the schema asks for
+            sections = {}
+            for name in schema.get("properties", {}):
+                if name == "summary":
+                    sections.update(self.summary(tag))
+                elif name == "mcqs":
+                    sections["mcqs"] = self.mcqs(tag)
+                elif name == "flashcards":
+                    sections["flashcards"] = self.flashcards(tag)
+            return json.dumps(sections)
+
+        if "frames from an educational video" in prompt:
+            return json.dumps([
+                {"frame": i, "description": f"Slide {i} shows a labelled diagram and a bullet list ({tag})."}
+                for i in range(1, images + 1)
+            ])
+        if images:
+            return (f"The image shows lecture slide {tag} with a title, a labelled diagram and three bullet points "
+                    "summarising the key definitions.")
+        if "Condense it into dense, factual notes" in prompt:
+            return "\n".join(f"- Note {i} on part {tag}: a key concept, its definition and an example."
+                             for i in range(1, 9))
+        if "multiple-choice questions" in prompt:
+            return json.dumps(self.mcqs(tag))
+        if "flashcards for spaced repetition" in prompt:
+            return json.dumps(self.flashcards(tag))
+        return json.dumps(self.summary(tag))
+
+    @staticmethod
+    def summary(tag: str) -> Dict:
+        return {
+            "summary": f"Summary {tag}. " + " ".join(
+                f"The material explains how {topic} {fact}." for topic, fact in TOPICS
+            ),
+            "takeaways": [f"Takeaway {i} ({tag}): {topic} {fact}" for i, (topic, fact) in enumerate(TOPICS[:5], 1)],
+        }
+
+    @staticmethod
+    def mcqs(tag: str) -> List[Dict]:
+        return [{
+            "question": f"Question {i} ({tag}): what does {topic} describe?",
+            "options": [f"A) It {fact}", "B) It measures temperature", "C) It names a planet", "D) It is a poem"],
+            "correct_answer": "A",
+            "explanation": f"{topic.capitalize()} {fact}.",
+            "bloom_level": ["Remember", "Understand", "Apply", "Analyze"][i % 4],
+        } for i, (topic, fact) in enumerate(TOPICS[:10], 1)]
+
+    @staticmethod
+    def flashcards(tag: str) -> List[Dict]:
+        return [{"front": f"What is {topic}? ({tag})", "back": f"It {fact}."} for topic, fact in TOPICS[:6]]
+
+# Fixtures
+
+def lecture_paragraphs(count: int, variant: int) -> List[str]:
+    """Deterministic lecture-style paragraphs; variant makes each job's content distinct"""
+    rng = random.Random(variant)
+    paragraphs = []
+    for i in range(count):
+        topic, fact = rng.choice(TOPICS)
+        paragraphs.append(
+            f"Section {i + 1} (copy {variant}). In this part we study {topic}. In short, {topic} {fact}. "
+            f"Consider example {rng.randint(1, 999)}: students should explain why {topic} matters and how it "
+            f"connects to the previous section. A common mistake is to confuse cause and effect here."
+        )
+    return paragraphs
+
+def make_txt(variant: int, paragraphs: int) -> bytes:
+    return "\n\n".join(lecture_paragraphs(paragraphs, variant)).encode()
+
+def make_pdf(variant: int, pages: int) -> bytes:
+    """A minimal text PDF, one block of lecture text per page, written by hand"""
+    def escape(line: str) -> str:
+        return line.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    font = 3 + 2 * pages
+    for page, paragraph in enumerate(lecture_paragraphs(pages, variant)):
+        words, lines, line = paragraph.split(), [], ""
+        for word in words:
+            if len(line) + len(word) > 80:
+                lines.append(line)
+                line = ""
+            line = f"{line} {word}".strip()
+        lines.append(line)
+        text = " T* ".join(f"({escape(l)}) Tj" for l in lines)
+        stream = f"BT /F1 11 Tf 14 TL 72 720 Td {text} ET"
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * page} 0 R "
+                       f"/Resources << /Font << /F1 {font} 0 R >> >> >>")
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out, offsets = b"%PDF-1.4\n", []
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{obj}\nendobj\n".encode()
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets).encode()
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return out
+
+def make_docx(variant: int, paragraphs: int) -> bytes:
+    from docx import Document
+    document = Document()
+    document.add_heading(f"Lecture notes {variant}", level=1)
+    for paragraph in lecture_paragraphs(paragraphs, variant):
+        document.add_paragraph(paragraph)
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+def make_image(variant: int, lines: int = 14) -> bytes:
+    """A slide-like PNG with dark text on white, for OCR and vision"""
+    image = Image.new("RGB", (1400, 1000), "white")
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=30)
+    except TypeError:  # Pillow < 10.1 has a single bitmap size
+        font = ImageFont.load_default()
+    text = " ".join(lecture_paragraphs(3, variant))
+    words, y, line = text.split(), 40, ""
+    for word in words:
+        if len(line) + len(word) > 70:
+            draw.text((40, y), line, fill="black", font=font)
+            y += 60
+            line = ""
+            if y > 40 + 60 * lines:
+                break
+        line = f"{line} {word}".strip()
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+def tone_samples(variant: int, seconds: float, rate: int = 16000) -> np.ndarray:
+    """Speech-like test signal: syllable-rate bursts of harmonics with short pauses"""
+    rng = np.random.default_rng(variant)
+    t = np.arange(int(seconds * rate)) / rate
+    pitch = 140 + 5 * (variant % 20)
+    voice = sum(np.sin(2 * np.pi * pitch * k * t) / k for k in range(1, 6))
+    envelope = (np.sin(2 * np.pi * 4 * t) > -0.2) * (np.sin(2 * np.pi * 0.4 * t) > -0.6)
+    signal = 0.3 * voice * envelope + 0.01 * rng.standard_normal(len(t))
+    return np.clip(signal, -1, 1).astype(np.float32)
+
+def make_wav(variant: int, seconds: float, rate: int = 16000) -> bytes:
+    samples = (tone_samples(variant, seconds, rate) * 32767).astype("<i2")
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+def make_mp4(variant: int, seconds: float) -> bytes:
+    """Slides with a tone soundtrack via ffmpeg, or silent slides via OpenCV without it"""
+    workdir = tempfile.mkdtemp(prefix="contentcube-bench-")
+    try:
+        path = os.path.join(workdir, "video.mp4")
+        slide = np.array(Image.open(io.BytesIO(make_image(variant))).convert("RGB").resize((640, 456)))
+        if shutil.which("ffmpeg"):
+            slide_path = os.path.join(workdir, "slide.png")
+            audio_path = os.path.join(workdir, "audio.wav")
+            Image.fromarray(slide).save(slide_path)
+            with open(audio_path, "wb") as f:
+                f.write(make_wav(variant, seconds))
+            subprocess.run([
+                "ffmpeg", "-y", "-loglevel", "error", "-loop", "1", "-framerate", "5", "-i", slide_path,
+                "-i", audio_path, "-t", str(seconds), "-c:v", "libx264", "-pix_fmt", "yuv420p",
+                "-c:a", "aac", "-shortest", path,
+            ], check=True)
+        else:
+            import cv2
+            writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"mp4v"), 5, (640, 456))
+            for frame in range(int(seconds * 5)):
+                shifted = np.roll(slide, frame * 4, axis=1)  # slow pan so frames differ
+                writer.write(cv2.cvtColor(shifted, cv2.COLOR_RGB2BGR))
+            writer.release()
+        with open(path, "rb") as f:
+            return f.read()
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+def make_fixture(content_type: str, variant: int, args: argparse.Namespace) -> Tuple[str, bytes, str]:
+    """(filename, data, mime type) for one job"""
+    if content_type == "pdf":
+        return f"lecture-{variant}.pdf", make_pdf(variant, args.pages), "application/pdf"
+    if content_type == "docx":
+        return (f"lecture-{variant}.docx", make_docx(variant, args.paragraphs),
+                "application/vnd.openxmlformats-officedocument.wordprocessingml.document")
+    if content_type == "txt":
+        return f"lecture-{variant}.txt", make_txt(variant, args.paragraphs), "text/plain"
+    if content_type == "image":
+        return f"slide-{variant}.png", make_image(variant), "image/png"
+    if content_type == "audio":
+        return f"lecture-{variant}.wav", make_wav(variant, args.audio_seconds), "audio/wav"
+    if content_type == "video":
+        return f"lecture-{variant}.mp4", make_mp4(variant, args.video_seconds), "video/mp4"
+    raise ValueError(f"Unknown content type {content_type}")
+
+# Measurement
+
+def percentile(values: List[float], pct: float) -> Optional[float]:
+    """Nearest-rank percentile"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(pct / 100 * len(ordered)) - 1)]
+
+def memory_probe(main_module) -> Tuple[Callable[[], float], str]:
+    """RSS of the API process and its worker pools if psutil is installed, otherwise the API process only"""
+    try:
+        import psutil
+    except ImportError:
+        return main_module.process_rss_bytes, "API process only (install psutil to include worker pools)"
+    process = psutil.Process()
+
+    def tree_rss() -> float:
+        total = process.memory_info().rss
+        for child in process.children(recursive=True):
+            try:
+                total += child.memory_info().rss
+            except psutil.Error:
+                pass
+        return float(total)
+    return tree_rss, "API process and worker pools"
+
+class PeakMemorySampler:
+    """Samples RSS on an interval in the background and keeps the peak since the last reset"""
+    def __init__(self, probe: Callable[[], float], interval: float = 0.05):
+        self.probe = probe
+        self.interval = interval
+        self.peak = 0.0
+        self._task = None
+
+    def reset(self):
+        self.peak = self.probe()
+
+    async def _run(self):
+        while True:
+            self.peak = max(self.peak, self.probe())
+            await asyncio.sleep(self.interval)
+
+    def start(self):
+        self.reset()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+async def run_job(session, base_url: str, fixture: Tuple[str, bytes, str], args: argparse.Namespace) -> Dict:
+    import aiohttp
+    filename, data, mime_type = fixture
+    form = aiohttp.FormData()
+    form.add_field("file", data, filename=filename, content_type=mime_type)
+    form.add_field("title", "Benchmark lecture")
+    for language in args.languages:
+        form.add_field("language_targets", language)
+
+    started = time.perf_counter()
+    async with session.post(f"{base_url}/repurpose", data=form) as response:
+        body = await response.json()
+        if response.status != 200:
+            return {"status": "rejected", "error": body.get("detail"), "latency": time.perf_counter() - started}
+
+    job_id = body["job_id"]
+    deadline = started + args.timeout
+    while time.perf_counter() < deadline:
+        async with session.get(f"{base_url}/jobs/{job_id}") as response:
+            job = await response.json()
+        if job.get("status") in ("completed", "failed"):
+            return {"status": job["status"], "error": job.get("error"), "latency": time.perf_counter() - started}
+        await asyncio.sleep(args.poll_interval)
+    return {"status": "timeout", "error": f"not finished after {args.timeout}s", "latency": time.perf_counter() - started}
+
+async def benchmark_type(session, base_url: str, content_type: str, args: argparse.Namespace,
+                         sampler: PeakMemorySampler) -> Dict:
+    variants = [0] * args.jobs if args.repeat_fixture else [int(time.time()) % 10 ** 6 * 1000 + i for i in range(args.jobs)]
+    fixtures = [make_fixture(content_type, variant, args) for variant in variants]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def limited(fixture):
+        async with semaphore:
+            return await run_job(session, base_url, fixture, args)
+
+    sampler.reset()
+    started = time.perf_counter()
+    results = await asyncio.gather(*[limited(fixture) for fixture in fixtures])
+    wall = time.perf_counter() - started
+
+    latencies = [r["latency"] for r in results if r["status"] == "completed"]
+    errors = sorted({str(r["error"]) for r in results if r["status"] != "completed"})
+    return {
+        "content_type": content_type,
+        "jobs": len(results),
+        "completed": len(latencies),
+        "failed": len(results) - len(latencies),
+        "fixture_bytes": sum(len(f[1]) for f in fixtures) // len(fixtures),
+        "wall_seconds": wall,
+        "throughput_jobs_per_second": len(latencies) / wall if wall else 0.0,
+        "latency_p50": percentile(latencies, 50),
+        "latency_p95": percentile(latencies, 95),
+        "latency_p99": percentile(latencies, 99),
+        "peak_rss_mb": sampler.peak / 1024 / 1024,
+        "errors": errors[:5],
+    }
+
+def print_report(reports: List[Dict], fake: FakeGeminiModel, memory_scope: str):
+    def seconds(value):
+        return f"{value:8.2f}" if value is not None else "       -"
+
+    print()
+    print(f"{'type':<7}{'jobs':>6}{'ok':>6}{'fail':>6}{'jobs/s':>9}{'p50 s':>9}{'p95 s':>9}{'p99 s':>9}{'peak MB':>10}")
+    for r in reports:
+        print(f"{r['content_type']:<7}{r['jobs']:>6}{r['completed']:>6}{r['failed']:>6}"
+              f"{r['throughput_jobs_per_second']:>9.2f} {seconds(r['latency_p50'])} {seconds(r['latency_p95'])} "
+              f"{seconds(r['latency_p99'])}{r['peak_rss_mb']:>10.1f}")
+    for r in reports:
+        for error in r["errors"]:
+            print(f"  {r['content_type']} failure: {error}")
+    print(f"\nFake Gemini: {fake.calls} calls, {fake.errors} injected errors, {fake.rate_limited} rate limited")
+    print(f"Peak memory covers the {memory_scope}")
+
+async def run_benchmark(args: argparse.Namespace) -> List[Dict]:
+    import aiohttp
+    import uvicorn
+    import main
+
+    fake = FakeGeminiModel(args.latency, args.jitter, args.error_rate, args.fake_rpm, args.seed)
+    main.model = fake
+
+    server = uvicorn.Server(uvicorn.Config(main.app, host="127.0.0.1", port=0, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if server_task.done():
+            server_task.result()  # raises the startup error
+        await asyncio.sleep(0.05)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    base_url = f"http://127.0.0.1:{port}"
+
+    probe, memory_scope = memory_probe(main)
+    sampler = PeakMemorySampler(probe)
+    sampler.start()
+    reports = []
+    try:
+        timeout = aiohttp.ClientTimeout(total=None)
+        async with aiohttp.ClientSession(timeout=timeout) as session:
+            for content_type in args.types:
+                print(f"Benchmarking {content_type}: {args.jobs} jobs, concurrency {args.concurrency}", flush=True)
+                try:
+                    reports.append(await benchmark_type(session, base_url, content_type, args, sampler))
+                except Exception as e:
+                    print(f"Skipping {content_type}: could not build or run the fixture ({e})")
+    finally:
+        await sampler.stop()
+        server.should_exit = True
+        await server_task
+
+    print_report(reports, fake, memory_scope)
+    return reports
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark with a local Gemini stand-in")
+    parser.add_argument("--types", default=",".join(CONTENT_TYPES),
+                        help=f"comma-separated content types ({', '.join(CONTENT_TYPES)})")
+    parser.add_argument("--jobs", type=int, default=10, help="jobs per content type")
+    parser.add_argument("--concurrency", type=int, default=4, help="jobs in flight at once")
+    parser.add_argument("--latency", type=float, default=0.5, help="mean fake Gemini reply time in seconds")
+    parser.add_argument("--jitter", type=float, default=0.3, help="reply time varies by +/- this fraction")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="share of fake Gemini calls that fail")
+    parser.add_argument("--fake-rpm", type=int, default=0,
+                        help="fake Gemini answers 429 beyond this many calls per minute (0 = unlimited)")
+    parser.add_argument("--limiter-rpm", type=int, default=6000,
+                        help="GEMINI_REQUESTS_PER_MINUTE for the app's own rate limiter (env var wins if set)")
+    parser.add_argument("--languages", default="", help="comma-separated language_targets sent with each job")
+    parser.add_argument("--pages", type=int, default=8, help="pages per PDF fixture")
+    parser.add_argument("--paragraphs", type=int, default=30, help="paragraphs per TXT and DOCX fixture")
+    parser.add_argument("--audio-seconds", type=float, default=20, help="length of the audio fixture")
+    parser.add_argument("--video-seconds", type=float, default=10, help="length of the video fixture")
+    parser.add_argument("--repeat-fixture", action="store_true", help="send identical files, so caches hit")
+    parser.add_argument("--poll-interval", type=float, default=0.1, help="seconds between job status polls")
+    parser.add_argument("--timeout", type=float, default=600, help="seconds before a job counts as timed out")
+    parser.add_argument("--seed", type=int, default=None, help="seed for the fake model's latency and errors")
+    parser.add_argument("--json", dest="json_path", help="also write the report to this JSON file")
+    args = parser.parse_args(argv)
+
+    args.types = [t.strip() for t in args.types.split(",") if t.strip()]
+    unknown = set(args.types) - set(CONTENT_TYPES)
+    if unknown:
+        parser.error(f"unknown content types: {', '.join(sorted(unknown))}")
+    args.languages = [l.strip() for l in args.languages.split(",") if l.strip()]
+    return args
+
+def main_cli(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    # main reads its configuration at import time, so defaults must be in place first
+    os.environ.setdefault("GEMINI_API_KEY", "benchmark")
+    os.environ.setdefault("GEMINI_REQUESTS_PER_MINUTE", str(args.limiter_rpm))
+    os.environ.setdefault("UPLOAD_DIR", os.path.join(tempfile.gettempdir(), "contentcube-bench-uploads"))
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    reports = asyncio.run(run_benchmark(args))
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump({"settings": {k: v for k, v in vars(args).items() if k != "json_path"}, "results": reports},
+                      f, indent=2)
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,13 +1,17 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, status, Form
+from fastapi import FastAPI, HTTPException, status, Request
+from fastapi.responses import JSONResponse, StreamingResponse, PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-import google.generativeai as genai
-import PyPDF2
-from docx import Document
+from pydantic import BaseModel, Field, ValidationError
+from google.api_core import exceptions as google_exceptions
+import python_multipart
+from python_multipart.multipart import parse_options_header as parse_multipart_options
 import json
 import uuid
 import io
-from typing import List, Dict, Optional, Union
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Iterator, List, Dict, Optional, Tuple, Union
 import re
 import csv
 from io import StringIO
@@ -15,22 +19,70 @@ import os
 from dotenv import load_dotenv
 import asyncio
 import time
+import random
 import mimetypes
 import hashlib
+import zlib
 import requests
 import tempfile
+import shutil
 import subprocess
 import base64
-from PIL import Image, ImageEnhance
-import speech_recognition as sr
-import yt_dlp
-import ffmpeg
-import pytesseract
-import whisper
-from moviepy import VideoFileClip
-import numpy as np
-import cv2
-from pydub import AudioSegment
+import aiofiles
+import multiprocessing
+import importlib
+import functools
+import wave
+import contextlib
+import sys
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageEnhance, ImageOps
+
+try:
+    import orjson  # optional: faster JSON rendering for exports
+except ImportError:
+    orjson = None
+
+class LazyModule:
+    """Stand-in for a module that is only imported when first used.
+    
+    Heavy media libraries are loaded this way so API workers (and document-only
+    worker processes) never pay for modalities they do not serve.
+    """
+    def __init__(self, name: str):
+        self.__dict__["_name"] = name
+        self.__dict__["_module"] = None
+    
+    def load(self):
+        if self._module is None:
+            self.__dict__["_module"] = importlib.import_module(self._name)
+        return self._module
+    
+    @property
+    def module_name(self) -> str:
+        return self._name
+    
+    @property
+    def loaded(self) -> bool:
+        return self._module is not None
+    
+    def __getattr__(self, attr: str):
+        return getattr(self.load(), attr)
+
+genai = LazyModule("google.generativeai")
+PyPDF2 = LazyModule("PyPDF2")
+docx = LazyModule("docx")
+sr = LazyModule("speech_recognition")
+yt_dlp = LazyModule("yt_dlp")
+ffmpeg = LazyModule("ffmpeg")
+pytesseract = LazyModule("pytesseract")
+whisper = LazyModule("whisper")
+np = LazyModule("numpy")
+cv2 = LazyModule("cv2")
+aioredis = LazyModule("redis.asyncio")
+psutil = LazyModule("psutil")
 
 PORT = int(os.environ.get("PORT", 8000))
 
@@ -42,15 +94,32 @@ api_key = os.getenv("GEMINI_API_KEY")
 if not api_key:
     raise ValueError("GEMINI_API_KEY not found in environment variables. Please check your .env file.")
 
-genai.configure(api_key=api_key)
-model = genai.GenerativeModel('gemini-2.5-flash')
+class LazyGeminiModel:
+    """Gemini model that imports and configures the SDK the first time it is used.
+    
+    Loading takes most of a second, so async code calls load() in a worker
+    thread (see GeminiRateLimiter._generate) rather than touching an attribute.
+    """
+    def __init__(self, model_name: str):
+        self.__dict__["model_name"] = model_name
+        self.__dict__["_model"] = None
+        self.__dict__["_lock"] = threading.Lock()
+    
+    @property
+    def loaded(self) -> bool:
+        return self._model is not None
+    
+    def load(self):
+        with self._lock:
+            if self._model is None:
+                genai.configure(api_key=api_key)
+                self.__dict__["_model"] = genai.GenerativeModel(self.model_name)
+        return self._model
+    
+    def __getattr__(self, attr: str):
+        return getattr(self._model or self.load(), attr)
 
-# Initialize Whisper model for audio transcription
-try:
-    whisper_model = whisper.load_model("base")
-except:
-    whisper_model = None
-    print("Warning: Whisper model not loaded. Audio transcription may be limited.")
+model = LazyGeminiModel('gemini-2.5-flash')
 
 app = FastAPI(title="CodeEd Universal Content Repurposer")
 
@@ -68,8 +137,33 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def reject_oversized_requests(request: Request, call_next):
+    """Reject uploads whose declared size is over the limit before the body is read"""
+    content_length = request.headers.get("content-length")
+    limit = request_size_limit(request)
+    if content_length and content_length.isdigit() and int(content_length) > limit:
+        return JSONResponse(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            content={"detail": f"Upload size exceeds {(limit - MAX_REQUEST_OVERHEAD)/1024/1024}MB limit"}
+        )
+    return await call_next(request)
+
+def request_size_limit(request: Request) -> int:
+    """Most bytes a request body may have, multipart overhead included"""
+    return (MAX_BATCH_SIZE if request.url.path == "/repurpose/batch" else MAX_FILE_SIZE) + MAX_REQUEST_OVERHEAD
+
 # Enhanced security constants
 MAX_FILE_SIZE = 500 * 1024 * 1024  # 500MB for video files
+# Batch uploads: most items per request and total upload size
+MAX_BATCH_ITEMS = int(os.getenv("MAX_BATCH_ITEMS", 50))
+MAX_BATCH_SIZE = int(os.getenv("MAX_BATCH_SIZE_MB", 2048)) * 1024 * 1024
+# Multipart overhead allowed on top of MAX_FILE_SIZE before a request is rejected outright
+MAX_REQUEST_OVERHEAD = 1024 * 1024
+
+# Uploads are streamed to this directory in chunks and removed once their job finishes
+UPLOAD_DIR = os.getenv("UPLOAD_DIR") or os.path.join(tempfile.gettempdir(), "contentcube-uploads")
+UPLOAD_CHUNK_SIZE = 1024 * 1024
 ALLOWED_MIME_TYPES = {
     # Documents
     'application/pdf': ['.pdf'],
@@ -101,52 +195,1341 @@ ALLOWED_MIME_TYPES = {
     'video/mkv': ['.mkv'],
 }
 
-# In-memory storage for demo
-jobs_storage = {}
+# Background job queue: number of async workers per content type
+JOB_WORKERS_PER_TYPE = {
+    "document": int(os.getenv("JOB_WORKERS_DOCUMENT", 4)),
+    "image": int(os.getenv("JOB_WORKERS_IMAGE", 2)),
+    "audio": int(os.getenv("JOB_WORKERS_AUDIO", 1)),
+    "video": int(os.getenv("JOB_WORKERS_VIDEO", 1)),
+    "youtube": int(os.getenv("JOB_WORKERS_YOUTUBE", 1)),
+    # Content generation after extraction; mostly waits on Gemini, so it can run wide
+    "generation": int(os.getenv("JOB_WORKERS_GENERATION", 8)),
+}
+JOB_QUEUE_MAX_SIZE = int(os.getenv("JOB_QUEUE_MAX_SIZE", 100))
+
+# Worker processes for CPU-bound work, per task type
+CPU_WORKERS_PER_TASK = {
+    "transcription": int(os.getenv("CPU_WORKERS_TRANSCRIPTION", 2)),
+    "ocr": int(os.getenv("CPU_WORKERS_OCR", 2)),
+    "video": int(os.getenv("CPU_WORKERS_VIDEO", 2)),
+    "document": int(os.getenv("CPU_WORKERS_DOCUMENT", 2)),
+}
+CPU_POOL_START_METHOD = os.getenv("CPU_POOL_START_METHOD", "spawn")
+# Modalities whose libraries and worker pools are loaded at startup, e.g. "audio,video"
+WARMUP_MODALITIES = [m.strip() for m in os.getenv("WARMUP_MODALITIES", "").split(",") if m.strip()]
+
+# Video key frame selection: decode rate, scene-change and near-duplicate thresholds, frame budget
+KEYFRAME_SAMPLE_FPS = float(os.getenv("KEYFRAME_SAMPLE_FPS", 1.0))
+KEYFRAME_SCENE_THRESHOLD = float(os.getenv("KEYFRAME_SCENE_THRESHOLD", 0.3))
+KEYFRAME_HASH_DISTANCE = int(os.getenv("KEYFRAME_HASH_DISTANCE", 6))
+KEYFRAME_MAX_FRAMES = int(os.getenv("KEYFRAME_MAX_FRAMES", 5))
+# Decode only the video's own key frames (encoders place them at scene cuts); "false" decodes every frame
+KEYFRAME_DECODE_KEY_ONLY = os.getenv("KEYFRAME_DECODE_KEY_ONLY", "true").lower() in ("1", "true", "yes")
+
+# Batched Gemini vision: frames per request and longest side of each frame in pixels
+VISION_BATCH_SIZE = int(os.getenv("VISION_BATCH_SIZE", 5))
+VISION_MAX_DIMENSION = int(os.getenv("VISION_MAX_DIMENSION", 768))
+
+# Image uploads: longest side sent to Gemini vision and given to OCR, and the amount of OCR
+# text (non-whitespace characters) above which the vision call is skipped (0 = always call vision)
+IMAGE_MAX_DIMENSION = int(os.getenv("IMAGE_MAX_DIMENSION", 1600))
+OCR_MAX_DIMENSION = int(os.getenv("OCR_MAX_DIMENSION", 3000))
+IMAGE_SKIP_VISION_OCR_CHARS = int(os.getenv("IMAGE_SKIP_VISION_OCR_CHARS", 0))
+
+# Whisper transcription: model size, optional int8 CPU inference, and VAD segmentation
+WHISPER_MODEL_NAME = os.getenv("WHISPER_MODEL", "base")
+WHISPER_INT8 = os.getenv("WHISPER_INT8", "false").lower() in ("1", "true", "yes")
+WHISPER_SAMPLE_RATE = 16000
+TRANSCRIPTION_SEGMENT_SECONDS = float(os.getenv("TRANSCRIPTION_SEGMENT_SECONDS", 60))
+VAD_MIN_SILENCE_SECONDS = float(os.getenv("VAD_MIN_SILENCE_SECONDS", 0.5))
+# Segments whose loudest 30ms frame stays below this level (dBFS) are treated as silence and skipped
+VAD_SILENCE_FLOOR_DBFS = float(os.getenv("VAD_SILENCE_FLOOR_DBFS", -60))
+# Seconds of audio per chunk read from the ffmpeg decoder pipe
+AUDIO_DECODE_CHUNK_SECONDS = float(os.getenv("AUDIO_DECODE_CHUNK_SECONDS", 10))
+
+# YouTube ingestion: "captions" uses subtitles/auto-captions when available and otherwise
+# transcribes an audio-only download, "audio" always transcribes, "video" runs the full video pipeline
+YOUTUBE_INGEST_MODE = os.getenv("YOUTUBE_INGEST_MODE", "captions").lower()
+YOUTUBE_MAX_DURATION_SECONDS = int(os.getenv("YOUTUBE_MAX_DURATION_SECONDS", 1800))
+YOUTUBE_CAPTION_LANGUAGES = [
+    lang.strip() for lang in os.getenv("YOUTUBE_CAPTION_LANGUAGES", "en").split(",") if lang.strip()
+]
+
+# PDF extraction: stop once the extracted text reaches the token budget (0 = whole document),
+# reading pages in order ("sequential") or spread evenly across the document ("even")
+PDF_TEXT_BUDGET_TOKENS = int(os.getenv("PDF_TEXT_BUDGET_TOKENS", 100000))
+PDF_PAGE_ORDER = os.getenv("PDF_PAGE_ORDER", "sequential").lower()
+PDF_PAGES_PER_TASK = int(os.getenv("PDF_PAGES_PER_TASK", 4))
+
+# Long-input condensing: text over GENERATION_INPUT_TOKENS is split into chunks of at most
+# CONDENSE_CHUNK_TOKENS, each summarized into its share of GENERATION_INPUT_TOKENS (but at
+# least CONDENSE_NOTES_TOKENS) of notes, then reduced
+GENERATION_INPUT_TOKENS = int(os.getenv("GENERATION_INPUT_TOKENS", 3000))
+CONDENSE_CHUNK_TOKENS = int(os.getenv("CONDENSE_CHUNK_TOKENS", 6000))
+CONDENSE_NOTES_TOKENS = int(os.getenv("CONDENSE_NOTES_TOKENS", 500))
+CONDENSE_MAX_LEVELS = 4
+
+# Languages results are localized into when a request does not name any
+DEFAULT_LANGUAGE_TARGETS = [
+    lang.strip() for lang in os.getenv("DEFAULT_LANGUAGE_TARGETS", "hi,es").split(",") if lang.strip()
+]
+MAX_LANGUAGE_TARGETS = int(os.getenv("MAX_LANGUAGE_TARGETS", 6))
+TRANSLATION_CACHE_MAX_ENTRIES = int(os.getenv("TRANSLATION_CACHE_MAX_ENTRIES", 20000))
+
+# Rendered exports kept in memory for repeat downloads, and the streamed chunk size
+EXPORT_CACHE_MAX_ENTRIES = int(os.getenv("EXPORT_CACHE_MAX_ENTRIES", 64))
+EXPORT_CHUNK_SIZE = 64 * 1024
+
+# Request summary, MCQs and flashcards in one schema-constrained Gemini call instead of three
+COMBINED_GENERATION = os.getenv("COMBINED_GENERATION", "false").lower() in ("1", "true", "yes")
+COMBINED_GENERATION_ATTEMPTS = int(os.getenv("COMBINED_GENERATION_ATTEMPTS", 2))
+
+# Content-addressed result caching; the disk tier is enabled by setting CACHE_DIR
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", 256))
+CACHE_DIR = os.getenv("CACHE_DIR") or None
+CACHE_DISK_MAX_BYTES = int(os.getenv("CACHE_DISK_MAX_MB", 1024)) * 1024 * 1024
+# Bump when extraction or generation changes so stale cache entries are ignored
+CACHE_VERSION = "10"
+
+# Gemini response cache: "memory", "disk" or "none"
+LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory").lower()
+LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 24 * 60 * 60))
+LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 1024))
+LLM_CACHE_DIR = os.getenv("LLM_CACHE_DIR") or os.path.join(CACHE_DIR or tempfile.gettempdir(), "llm")
+LLM_CACHE_DISK_MAX_BYTES = int(os.getenv("LLM_CACHE_DISK_MAX_MB", 256)) * 1024 * 1024
+
+# Job status storage: "memory" (single process) or "redis" (shared across workers and nodes)
+JOB_STORE_BACKEND = os.getenv("JOB_STORE", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+JOB_TTL_SECONDS = int(os.getenv("JOB_TTL_SECONDS", 24 * 60 * 60))
+JOB_STORE_MAX_JOBS = int(os.getenv("JOB_STORE_MAX_JOBS", 10000))
+# Comment line sent on idle job event streams so proxies keep the connection open
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", 15))
+
+# Per-job tracing: spans kept per job, and the opt-in sampling profiler (interval, stacks kept)
+TRACE_MAX_SPANS = int(os.getenv("TRACE_MAX_SPANS", 2000))
+JOB_PROFILING_ENABLED = os.getenv("JOB_PROFILING_ENABLED", "false").lower() in ("1", "true", "yes")
+PROFILE_INTERVAL_SECONDS = float(os.getenv("PROFILE_INTERVAL_MS", 5)) / 1000
+PROFILE_MAX_STACKS = int(os.getenv("PROFILE_MAX_STACKS", 500))
+
+def pack_result(result: Any) -> bytes:
+    """Serialize a job result to a compact zlib-compressed JSON blob"""
+    return zlib.compress(json.dumps(result, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+def unpack_result(blob: Optional[bytes]) -> Any:
+    return json.loads(zlib.decompress(blob).decode("utf-8")) if blob else None
+
+class JobStore(ABC):
+    """Storage for job status and results.
+    
+    Jobs are plain dicts with job_id, status, stage, progress, result and error.
+    Implementations keep results as compressed blobs and expire jobs ttl seconds
+    after their last update.
+    """
+    @abstractmethod
+    async def create(self, job: Dict):
+        ...
+    
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict]:
+        ...
+    
+    @abstractmethod
+    async def update(self, job_id: str, **fields):
+        ...
+    
+    @abstractmethod
+    async def delete(self, job_id: str):
+        ...
+    
+    @abstractmethod
+    async def publish(self, job_id: str, event: Dict):
+        """Push a progress event to everyone subscribed to the job"""
+        ...
+    
+    @abstractmethod
+    async def subscribe(self, job_id: str) -> "JobSubscription":
+        """Start receiving the job's events; events published before this call are not replayed"""
+        ...
+    
+    @abstractmethod
+    async def save_record(self, kind: str, record_id: str, record: Dict):
+        """Store a non-job record (e.g. a batch) that expires like a job but is not one"""
+        ...
+    
+    @abstractmethod
+    async def get_record(self, kind: str, record_id: str) -> Optional[Dict]:
+        ...
+    
+    async def close(self):
+        pass
+
+class JobSubscription(ABC):
+    """Stream of progress events for one job"""
+    @abstractmethod
+    async def next_event(self, timeout: float) -> Optional[Dict]:
+        """Wait up to timeout seconds for the next event; None when nothing arrived"""
+        ...
+    
+    async def close(self):
+        pass
+
+class MemoryJobSubscription(JobSubscription):
+    def __init__(self, queue: asyncio.Queue, on_close: Callable[[], None]):
+        self.queue = queue
+        self.on_close = on_close
+    
+    async def next_event(self, timeout: float) -> Optional[Dict]:
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+    
+    async def close(self):
+        self.on_close()
+
+class RedisJobSubscription(JobSubscription):
+    def __init__(self, pubsub: Any):
+        self.pubsub = pubsub
+    
+    async def next_event(self, timeout: float) -> Optional[Dict]:
+        deadline = time.monotonic() + timeout
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return None
+            message = await self.pubsub.get_message(ignore_subscribe_messages=True, timeout=remaining)
+            if message and message.get("type") == "message":
+                return json.loads(message["data"])
+    
+    async def close(self):
+        await self.pubsub.aclose()
+
+class InMemoryJobStore(JobStore):
+    """Process-local job store, bounded by TTL and a maximum number of jobs"""
+    def __init__(self, ttl: float, max_jobs: int = 10000):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        self.jobs = OrderedDict()  # job_id -> (expires_at, job with packed result)
+        self.records = OrderedDict()  # (kind, record_id) -> (expires_at, packed record)
+        self.subscribers: Dict[str, set] = {}
+    
+    def _evict(self, entries: OrderedDict):
+        now = time.time()
+        while entries:
+            key, (expires_at, _) = next(iter(entries.items()))
+            if expires_at >= now and len(entries) <= self.max_jobs:
+                break
+            del entries[key]
+    
+    def _store(self, job_id: str, job: Dict):
+        self.jobs[job_id] = (time.time() + self.ttl, job)
+        self.jobs.move_to_end(job_id)
+        self._evict(self.jobs)
+    
+    async def create(self, job: Dict):
+        self._store(job["job_id"], {**job, "result": pack_result(job.get("result"))})
+    
+    async def get(self, job_id: str) -> Optional[Dict]:
+        entry = self.jobs.get(job_id)
+        if entry is None or entry[0] < time.time():
+            return None
+        job = entry[1]
+        return {**job, "result": unpack_result(job["result"])}
+    
+    async def update(self, job_id: str, **fields):
+        entry = self.jobs.get(job_id)
+        if entry is None:
+            return
+        if "result" in fields:
+            fields["result"] = pack_result(fields["result"])
+        self._store(job_id, {**entry[1], **fields})
+    
+    async def delete(self, job_id: str):
+        self.jobs.pop(job_id, None)
+    
+    async def publish(self, job_id: str, event: Dict):
+        for queue in self.subscribers.get(job_id, ()):
+            queue.put_nowait(event)
+    
+    async def subscribe(self, job_id: str) -> JobSubscription:
+        queue = asyncio.Queue()
+        self.subscribers.setdefault(job_id, set()).add(queue)
+        
+        def unsubscribe():
+            queues = self.subscribers.get(job_id, set())
+            queues.discard(queue)
+            if not queues:
+                self.subscribers.pop(job_id, None)
+        
+        return MemoryJobSubscription(queue, unsubscribe)
+    
+    async def save_record(self, kind: str, record_id: str, record: Dict):
+        self.records[(kind, record_id)] = (time.time() + self.ttl, pack_result(record))
+        self.records.move_to_end((kind, record_id))
+        self._evict(self.records)
+    
+    async def get_record(self, kind: str, record_id: str) -> Optional[Dict]:
+        entry = self.records.get((kind, record_id))
+        if entry is None or entry[0] < time.time():
+            return None
+        return unpack_result(entry[1])
+
+class RedisJobStore(JobStore):
+    """Redis-backed job store shared by every API worker and node.
+    
+    Each job is a Redis hash with JSON-encoded fields and a compressed result
+    blob; the key's TTL is refreshed on every write. Progress events go through
+    Redis pub/sub so a client can follow a job running on another worker. Any
+    client with the redis.asyncio API can be passed in, e.g. a local stand-in for tests.
+    """
+    def __init__(self, client: Any, ttl: float, prefix: str = "contentcube:job:",
+                 record_prefix: str = "contentcube:record:"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.record_prefix = record_prefix
+    
+    def _key(self, job_id: str) -> str:
+        return f"{self.prefix}{job_id}"
+    
+    @staticmethod
+    def _encode(fields: Dict) -> Dict:
+        return {
+            name: pack_result(value) if name == "result" else json.dumps(value)
+            for name, value in fields.items()
+        }
+    
+    async def _write(self, job_id: str, fields: Dict):
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.hset(self._key(job_id), mapping=self._encode(fields))
+            pipe.expire(self._key(job_id), self.ttl)
+            await pipe.execute()
+    
+    async def create(self, job: Dict):
+        await self._write(job["job_id"], job)
+    
+    async def get(self, job_id: str) -> Optional[Dict]:
+        raw = await self.client.hgetall(self._key(job_id))
+        if not raw:
+            return None
+        job = {}
+        for name, value in raw.items():
+            name = name.decode() if isinstance(name, bytes) else name
+            job[name] = unpack_result(value) if name == "result" else json.loads(value)
+        return job
+    
+    async def update(self, job_id: str, **fields):
+        # Ignore updates for jobs that expired or were deleted rather than recreating a partial job
+        if await self.client.exists(self._key(job_id)):
+            await self._write(job_id, fields)
+    
+    async def delete(self, job_id: str):
+        await self.client.delete(self._key(job_id))
+    
+    def _channel(self, job_id: str) -> str:
+        return f"{self.prefix}events:{job_id}"
+    
+    async def publish(self, job_id: str, event: Dict):
+        await self.client.publish(self._channel(job_id), json.dumps(event))
+    
+    async def subscribe(self, job_id: str) -> JobSubscription:
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self._channel(job_id))
+        return RedisJobSubscription(pubsub)
+    
+    def _record_key(self, kind: str, record_id: str) -> str:
+        return f"{self.record_prefix}{kind}:{record_id}"
+    
+    async def save_record(self, kind: str, record_id: str, record: Dict):
+        await self.client.set(self._record_key(kind, record_id), pack_result(record), ex=self.ttl)
+    
+    async def get_record(self, kind: str, record_id: str) -> Optional[Dict]:
+        return unpack_result(await self.client.get(self._record_key(kind, record_id)))
+    
+    async def close(self):
+        await self.client.aclose()
+
+def create_job_store() -> JobStore:
+    """Build the job store selected by JOB_STORE ("memory" or "redis")"""
+    if JOB_STORE_BACKEND == "redis":
+        return RedisJobStore(aioredis.Redis.from_url(REDIS_URL), ttl=JOB_TTL_SECONDS)
+    return InMemoryJobStore(ttl=JOB_TTL_SECONDS, max_jobs=JOB_STORE_MAX_JOBS)
+
+# Global job store
+job_store = create_job_store()
+
+# Job being processed by the current task, so deep pipeline steps can report progress
+current_job_id: ContextVar[Optional[str]] = ContextVar("current_job_id", default=None)
+
+async def update_job_progress(job_id: str, event: str, stage: Optional[str] = None,
+                              progress: Optional[int] = None, **details):
+    """Record a job's stage/progress and push it to event stream subscribers"""
+    fields = {name: value for name, value in (("stage", stage), ("progress", progress)) if value is not None}
+    if fields:
+        await job_store.update(job_id, **fields)
+    await job_store.publish(job_id, {"event": event, "job_id": job_id, **fields, **details})
+
+class JobTrace:
+    """Span tree of one job: every stage and sub-call with its start, end and attributes.
+    
+    Spans are appended in start order and point at their parent; "lane" numbers the
+    asyncio task a span ran in, so concurrent stages can be drawn side by side.
+    """
+    def __init__(self, job_id: str, started: Optional[float] = None):
+        self.job_id = job_id
+        self.started = started or time.time()
+        self.spans: List[Dict] = []
+        self.dropped_spans = 0
+        self.lanes: Dict[int, int] = {}
+    
+    def start_span(self, name: str, parent_id: Optional[int], attributes: Dict,
+                   start: Optional[float] = None) -> Dict:
+        if len(self.spans) >= TRACE_MAX_SPANS:
+            self.dropped_spans += 1
+            return {"span_id": parent_id, "attributes": {}}  # not recorded; children attach to the parent
+        try:
+            task = asyncio.current_task()
+        except RuntimeError:
+            task = None
+        span = {
+            "span_id": len(self.spans) + 1,
+            "parent_id": parent_id,
+            "name": name,
+            "start": start or time.time(),
+            "end": None,
+            "lane": self.lanes.setdefault(id(task), len(self.lanes)),
+            "status": "ok",
+            "attributes": attributes,
+        }
+        self.spans.append(span)
+        return span
+    
+    def add_span(self, name: str, start: float, end: float, **attributes):
+        """Record a span that has already finished, e.g. time spent waiting in a queue"""
+        span = self.start_span(name, None, attributes, start=start)
+        span["end"] = end
+    
+    def to_dict(self) -> Dict:
+        return {"job_id": self.job_id, "started": self.started, "spans": self.spans,
+                "dropped_spans": self.dropped_spans}
+
+# Trace and span of the job being processed by the current task
+current_trace: ContextVar[Optional[JobTrace]] = ContextVar("current_trace", default=None)
+current_span_id: ContextVar[Optional[int]] = ContextVar("current_span_id", default=None)
+
+@contextlib.contextmanager
+def trace_span(name: str, **attributes) -> Iterator[Dict]:
+    """Record a span in the current job's trace; yields its attributes so callers can add to them.
+    
+    Outside a job this only yields a scratch dict, so it is cheap to leave in shared code paths.
+    """
+    trace = current_trace.get()
+    if trace is None:
+        yield attributes
+        return
+    span = trace.start_span(name, current_span_id.get(), attributes)
+    token = current_span_id.set(span["span_id"])
+    profiler = current_profiler.get()
+    if profiler:
+        profiler.track_current_task()
+    try:
+        yield span["attributes"]
+    except BaseException as e:
+        span["status"] = "error"
+        span["error"] = f"{type(e).__name__}: {e}"[:300]
+        raise
+    finally:
+        span["end"] = time.time()
+        current_span_id.reset(token)
+
+def trace_tree(trace: Dict) -> List[Dict]:
+    """Nest a stored trace's spans under their parents, with durations in milliseconds"""
+    now = time.time()
+    nodes = {}
+    roots = []
+    for span in trace["spans"]:
+        node = {
+            "name": span["name"],
+            "start_ms": round((span["start"] - trace["started"]) * 1000, 2),
+            "duration_ms": round(((span["end"] or now) - span["start"]) * 1000, 2),
+            "status": span["status"] if span["end"] else "running",
+            **({"error": span["error"]} if "error" in span else {}),
+            "attributes": span["attributes"],
+            "children": [],
+        }
+        nodes[span["span_id"]] = node
+        parent = nodes.get(span["parent_id"])
+        (parent["children"] if parent else roots).append(node)
+    return roots
+
+def chrome_trace(trace: Dict) -> Dict:
+    """A stored trace in Chrome's Trace Event Format (chrome://tracing, Perfetto, speedscope)"""
+    now = time.time()
+    events = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"job {trace['job_id']}"}}]
+    for span in trace["spans"]:
+        events.append({
+            "name": span["name"],
+            "cat": span["name"].split(".")[0],
+            "ph": "X",
+            "ts": round(span["start"] * 1_000_000),
+            "dur": round(((span["end"] or now) - span["start"]) * 1_000_000),
+            "pid": 1,
+            "tid": span["lane"],
+            "args": {**span["attributes"], "status": span["status"], **({"error": span["error"]} if "error" in span else {})},
+        })
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+def folded_stack(frame) -> str:
+    """A frame's call stack, outermost first, in the folded "a;b;c" format of flame graph tools"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+def _run_sampled_in_worker(interval: float, func: Callable, *args) -> Tuple[Any, Dict[str, int]]:
+    """Run func(*args) in a pool worker while sampling its stack; returns (result, stack counts)"""
+    samples: Dict[str, int] = {}
+    target = threading.get_ident()
+    done = threading.Event()
+    
+    def sample():
+        while not done.wait(interval):
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                stack = folded_stack(frame)
+                samples[stack] = samples.get(stack, 0) + 1
+    
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    try:
+        return func(*args), samples
+    finally:
+        done.set()
+        sampler.join()
+
+class JobProfiler:
+    """Opt-in sampling profiler for a single job.
+    
+    A background thread samples the event loop thread's stack every `interval`
+    seconds, keeping only samples taken while one of the job's own tasks was
+    running, so other jobs on the same loop do not show up. Calls the job makes
+    into the CPU worker pools are sampled inside the worker and merged in.
+    """
+    def __init__(self, interval: float = PROFILE_INTERVAL_SECONDS):
+        if not self.supported():
+            raise RuntimeError("Job profiling needs asyncio.tasks._current_tasks, which this Python does not have")
+        self.interval = interval
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread = threading.get_ident()
+        self.tasks = weakref.WeakSet()
+        self.stacks: Dict[str, int] = {}
+        self.samples = 0
+        self.started = time.time()
+        self.stopped = None
+        self._done = threading.Event()
+        self._thread = threading.Thread(target=self._sample, name="job-profiler", daemon=True)
+    
+    def start(self):
+        self.track_current_task()
+        self._thread.start()
+    
+    def stop(self):
+        if self.stopped is None:
+            self.stopped = time.time()
+            self._done.set()
+    
+    def track_current_task(self):
+        task = asyncio.current_task()
+        if task is not None:
+            self.tasks.add(task)
+    
+    def untrack_current_task(self):
+        self.tasks.discard(asyncio.current_task())
+    
+    @staticmethod
+    def supported() -> bool:
+        return isinstance(getattr(asyncio.tasks, "_current_tasks", None), dict)
+    
+    def _running_task(self):
+        # The task currently stepped by the loop (asyncio keeps one entry per running loop)
+        return asyncio.tasks._current_tasks.get(self.loop)
+    
+    def _sample(self):
+        while not self._done.wait(self.interval):
+            task = self._running_task()
+            if task is None or task not in self.tasks:
+                continue
+            frame = sys._current_frames().get(self.loop_thread)
+            if frame is not None:
+                self.add("event_loop;" + folded_stack(frame))
+    
+    def add(self, stack: str, count: int = 1):
+        self.stacks[stack] = self.stacks.get(stack, 0) + count
+        self.samples += count
+    
+    def add_worker_samples(self, task: str, stacks: Dict[str, int]):
+        for stack, count in stacks.items():
+            self.add(f"worker:{task};{stack}", count)
+    
+    def to_dict(self) -> Dict:
+        top = sorted(self.stacks.items(), key=lambda item: item[1], reverse=True)[:PROFILE_MAX_STACKS]
+        return {
+            "interval_ms": self.interval * 1000,
+            "duration_seconds": round((self.stopped or time.time()) - self.started, 3),
+            "samples": self.samples,
+            "stacks": [{"stack": stack, "samples": count} for stack, count in top],
+        }
+
+# Profiler attached to the current job, if it asked for one
+current_profiler: ContextVar[Optional[JobProfiler]] = ContextVar("current_profiler", default=None)
+
+# Traces of jobs running in this process; finished traces are saved to the job store
+active_traces: Dict[str, JobTrace] = {}
+
+async def save_job_trace(job_id: str, trace: JobTrace, profiler: Optional[JobProfiler] = None):
+    """Store a job's trace (and profile) next to the job so any worker can serve it"""
+    await job_store.save_record("trace", job_id, {
+        "trace": trace.to_dict(),
+        "profile": profiler.to_dict() if profiler else None,
+    })
+
+async def report_extraction_progress(stage: str, fraction: float, **details):
+    """Move the current job's progress through the extraction range (10-30%)"""
+    job_id = current_job_id.get()
+    if job_id:
+        await update_job_progress(job_id, "progress", stage=stage, progress=10 + int(20 * min(1.0, fraction)), **details)
+
+class MemoryLRUCache:
+    """In-memory cache that evicts the least recently used entry beyond max_entries.
+    
+    Entries can be given a TTL in seconds, after which they read as missing.
+    """
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+    
+    def get(self, key: str) -> Optional[Any]:
+        if key not in self.entries:
+            return None
+        expires_at, value = self.entries[key]
+        if expires_at is not None and expires_at < time.time():
+            del self.entries[key]
+            return None
+        self.entries.move_to_end(key)
+        return value
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        self.entries[key] = (time.time() + ttl if ttl else None, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+    
+    def __len__(self) -> int:
+        return len(self.entries)
+
+class DiskCache:
+    """On-disk cache tier storing one JSON file per key.
+    
+    Reads bump the file's mtime. The directory's size is tracked in memory as
+    entries are written; once it grows past max_bytes one scan deletes the least
+    recently used files down to evict_to of max_bytes, and resyncs the total with
+    what is actually on disk (including other processes' writes). Entries can be
+    given a TTL in seconds.
+    """
+    def __init__(self, directory: str, max_bytes: int, evict_to: float = 0.9):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.evict_to = evict_to
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self.total_bytes = sum(size for _, size, _ in self._scan())
+    
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+    
+    def _file_size(self, path: str) -> int:
+        try:
+            return os.path.getsize(path)
+        except OSError:
+            return 0
+    
+    def _remove(self, path: str):
+        size = self._file_size(path)
+        try:
+            os.unlink(path)
+        except OSError:
+            return
+        with self.lock:
+            self.total_bytes -= size
+    
+    def get(self, key: str) -> Optional[Any]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if not isinstance(entry, dict) or "value" not in entry:
+            return None
+        if entry.get("expires_at") is not None and entry["expires_at"] < time.time():
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry["value"]
+    
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": time.time() + ttl if ttl else None, "value": value}, f, ensure_ascii=False)
+        replaced = self._file_size(path)
+        written = self._file_size(temp_path)
+        os.replace(temp_path, path)
+        with self.lock:
+            self.total_bytes += written - replaced
+            over = self.total_bytes > self.max_bytes
+        if over:
+            self._evict()
+    
+    def _scan(self) -> List[Tuple[float, int, str]]:
+        files = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(".json"):
+                try:
+                    stat = entry.stat()
+                except OSError:
+                    continue  # Removed concurrently
+                files.append((stat.st_mtime, stat.st_size, entry.path))
+        return files
+    
+    def _evict(self):
+        files = self._scan()
+        total = sum(size for _, size, _ in files)
+        target = self.max_bytes * self.evict_to
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            try:
+                os.unlink(path)
+                total -= size
+            except OSError:
+                pass
+        with self.lock:
+            self.total_bytes = total
+
+class ContentCache:
+    """Content-addressed cache with an in-memory LRU tier and an optional disk tier"""
+    def __init__(self, name: str, max_entries: int = 256, disk_dir: Optional[str] = None,
+                 disk_max_bytes: int = 0):
+        self.name = name
+        self.memory = MemoryLRUCache(max_entries)
+        self.disk = DiskCache(os.path.join(disk_dir, name), disk_max_bytes) if disk_dir else None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+    
+    async def get(self, key: str) -> Optional[Any]:
+        value = self.memory.get(key)
+        if value is None and self.disk:
+            value = await asyncio.to_thread(self.disk.get, key)
+            if value is not None:
+                self.disk_hits += 1
+                self.memory.set(key, value)
+        if value is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return value
+    
+    async def set(self, key: str, value: Any):
+        self.memory.set(key, value)
+        if self.disk:
+            try:
+                await asyncio.to_thread(self.disk.set, key, value)
+            except OSError as e:
+                print(f"Warning: could not write {self.name} cache entry to disk: {e}")
+    
+    async def get_many(self, keys: List[str]) -> List[Optional[Any]]:
+        """Look up many keys, reading the disk misses in a single worker thread"""
+        values = [self.memory.get(key) for key in keys]
+        missing = [i for i, value in enumerate(values) if value is None]
+        if missing and self.disk:
+            found = await asyncio.to_thread(lambda: [self.disk.get(keys[i]) for i in missing])
+            for i, value in zip(missing, found):
+                if value is not None:
+                    self.disk_hits += 1
+                    self.memory.set(keys[i], value)
+                    values[i] = value
+        found_count = sum(value is not None for value in values)
+        self.hits += found_count
+        self.misses += len(keys) - found_count
+        return values
+    
+    async def set_many(self, entries: Dict[str, Any]):
+        """Store many entries, writing them to disk together in a single worker thread"""
+        for key, value in entries.items():
+            self.memory.set(key, value)
+        if self.disk and entries:
+            def write_all():
+                for key, value in entries.items():
+                    self.disk.set(key, value)
+            try:
+                await asyncio.to_thread(write_all)
+            except OSError as e:
+                print(f"Warning: could not write {self.name} cache entries to disk: {e}")
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "memory_entries": len(self.memory),
+            "disk_enabled": self.disk is not None,
+        }
+
+def content_hash(*parts: Union[bytes, str]) -> str:
+    """SHA-256 over the given parts, length-prefixed so part boundaries are unambiguous"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        digest.update(len(part).to_bytes(8, "big"))
+        digest.update(part)
+    return digest.hexdigest()
+
+# Fallbacks taken by the current job step (a failed call replaced by placeholder text);
+# output of a step that took any is not cached. One list per step, shared with its subtasks.
+current_fallbacks: ContextVar[Optional[List[str]]] = ContextVar("current_fallbacks", default=None)
+
+def record_fallback(reason: str):
+    """Mark the current job step's output as incomplete so it is not cached"""
+    fallbacks = current_fallbacks.get()
+    if fallbacks is not None:
+        fallbacks.append(reason)
+
+def is_cacheable() -> bool:
+    return not current_fallbacks.get()
+
+# Global caches: uploaded bytes -> extracted text, extracted text -> generated result
+# (before localization), (language, source text segment) -> translated segment
+extraction_cache = ContentCache("extraction", CACHE_MAX_ENTRIES, CACHE_DIR, CACHE_DISK_MAX_BYTES)
+result_cache = ContentCache("result", CACHE_MAX_ENTRIES, CACHE_DIR, CACHE_DISK_MAX_BYTES)
+translation_cache = ContentCache("translation", TRANSLATION_CACHE_MAX_ENTRIES, CACHE_DIR, CACHE_DISK_MAX_BYTES)
+
+class LLMResponseCache:
+    """Cache of Gemini responses keyed by model name, prompt text and image digests.
+    
+    The backend is a MemoryLRUCache or DiskCache and entries expire after ttl
+    seconds. Concurrent requests for the same key are collapsed into one call:
+    the first caller makes the request and the others wait for its result. If
+    that caller is cancelled, a waiting caller takes over the request.
+    """
+    def __init__(self, backend: Union[MemoryLRUCache, DiskCache], ttl: Optional[float] = None):
+        self.backend = backend
+        self.ttl = ttl
+        self.in_flight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.deduplicated = 0
+    
+    @staticmethod
+    def make_key(model_name: str, prompt: str, images: List[bytes] = (),
+                 generation_config: Optional[Dict] = None) -> str:
+        image_digests = [hashlib.sha256(image).hexdigest() for image in images]
+        config = [json.dumps(generation_config, sort_keys=True)] if generation_config else []
+        return content_hash(model_name, prompt, *image_digests, *config)
+    
+    async def _get(self, key: str) -> Optional[str]:
+        if isinstance(self.backend, DiskCache):
+            return await asyncio.to_thread(self.backend.get, key)
+        return self.backend.get(key)
+    
+    async def _set(self, key: str, value: str):
+        try:
+            if isinstance(self.backend, DiskCache):
+                await asyncio.to_thread(self.backend.set, key, value, self.ttl)
+            else:
+                self.backend.set(key, value, self.ttl)
+        except OSError as e:
+            print(f"Warning: could not store LLM response in cache: {e}")
+    
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]],
+                             validate: Optional[Callable[[str], Any]] = None) -> str:
+        """Return the cached response for key, or compute it once for all concurrent callers.
+        
+        A computed response is only stored once validate (if given) accepts it; when
+        validate raises, the error goes to every waiting caller and nothing is cached.
+        """
+        cached = await self._get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        
+        if key in self.in_flight:
+            self.deduplicated += 1
+            shared = self.in_flight[key]
+            try:
+                return await asyncio.shield(shared)
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                # The caller making the request was cancelled, not this one: make it ourselves
+                return await self.get_or_compute(key, compute, validate)
+        
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        # Mark the outcome as retrieved so an unshared failure is not reported as unhandled
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self.in_flight[key] = future
+        try:
+            value = await compute()
+            if validate:
+                validate(value)
+            await self._set(key, value)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            del self.in_flight[key]
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses + self.deduplicated
+        return {
+            "backend": "disk" if isinstance(self.backend, DiskCache) else "memory",
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "deduplicated": self.deduplicated,
+            "hit_rate": round((self.hits + self.deduplicated) / lookups, 3) if lookups else 0.0,
+            "in_flight": len(self.in_flight),
+        }
+
+def create_llm_response_cache() -> Optional[LLMResponseCache]:
+    """Build the Gemini response cache from LLM_CACHE_* settings (None when disabled)"""
+    if LLM_CACHE_BACKEND == "none":
+        return None
+    if LLM_CACHE_BACKEND == "disk":
+        backend = DiskCache(LLM_CACHE_DIR, LLM_CACHE_DISK_MAX_BYTES)
+    else:
+        backend = MemoryLRUCache(LLM_CACHE_MAX_ENTRIES)
+    return LLMResponseCache(backend, ttl=LLM_CACHE_TTL_SECONDS)
+
+# Global Gemini response cache
+llm_response_cache = create_llm_response_cache()
+
+# Seconds; covers quick cache lookups up to long video transcriptions
+DEFAULT_LATENCY_BUCKETS = (0.005, 0.025, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900)
+
+def escape_label_value(value: Any) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_metric_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{escape_label_value(value)}"' for name, value in labels.items()) + "}"
+
+class Counter:
+    """Monotonic counter per label set, rendered in the Prometheus text format"""
+    type_name = "counter"
+    
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = ()):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.values: Dict[tuple, float] = {}
+    
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[label]) for label in self.labelnames)
+        self.values[key] = self.values.get(key, 0) + amount
+    
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        return [(self.name, dict(zip(self.labelnames, key)), value) for key, value in self.values.items()]
+
+class Histogram:
+    """Cumulative-bucket histogram per label set, rendered in the Prometheus text format"""
+    type_name = "histogram"
+    
+    def __init__(self, name: str, description: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_LATENCY_BUCKETS):
+        self.name = name
+        self.description = description
+        self.labelnames = labelnames
+        self.buckets = tuple(sorted(buckets))
+        self.series: Dict[tuple, list] = {}  # labels -> [bucket counts..., sum, count]
+    
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[label]) for label in self.labelnames)
+        series = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                series[i] += 1
+        series[-2] += value
+        series[-1] += 1
+    
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        samples = []
+        for key, series in self.series.items():
+            labels = dict(zip(self.labelnames, key))
+            for bound, count in zip(self.buckets, series):
+                samples.append((f"{self.name}_bucket", {**labels, "le": repr(float(bound))}, count))
+            samples.append((f"{self.name}_bucket", {**labels, "le": "+Inf"}, series[-1]))
+            samples.append((f"{self.name}_sum", labels, series[-2]))
+            samples.append((f"{self.name}_count", labels, series[-1]))
+        return samples
+
+class CallbackGauge:
+    """Gauge whose samples are read from the running system at scrape time"""
+    type_name = "gauge"
+    
+    def __init__(self, name: str, description: str, collect: Callable[[], List[Tuple[Dict[str, str], float]]]):
+        self.name = name
+        self.description = description
+        self.collect = collect
+    
+    def samples(self) -> List[Tuple[str, Dict[str, str], float]]:
+        try:
+            return [(self.name, labels, value) for labels, value in self.collect()]
+        except Exception as e:
+            print(f"Warning: could not collect metric {self.name}: {e}")
+            return []
+
+class CallbackCounter(CallbackGauge):
+    """Counter whose running totals are read from the running system at scrape time"""
+    type_name = "counter"
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: List[Any] = []
+    
+    def register(self, metric: Any) -> Any:
+        self.metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.description}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{format_metric_labels(labels)} {value}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+STAGE_SECONDS = metrics.register(Histogram(
+    "contentcube_stage_duration_seconds",
+    "Duration of pipeline stages (upload, extraction per content type, transcription, generation, localization)",
+    ("stage",)
+))
+STAGE_ERRORS = metrics.register(Counter(
+    "contentcube_stage_errors_total", "Pipeline stages that raised an error", ("stage",)
+))
+GEMINI_SECONDS = metrics.register(Histogram(
+    "contentcube_gemini_request_duration_seconds",
+    "Latency of Gemini API calls (each attempt, excluding rate limiter wait)", ("prompt_kind", "outcome")
+))
+GEMINI_ERRORS = metrics.register(Counter(
+    "contentcube_gemini_errors_total", "Failed Gemini API calls", ("prompt_kind", "error")
+))
+GEMINI_TOKENS = metrics.register(Counter(
+    "contentcube_gemini_tokens_total", "Tokens reported by Gemini usage metadata", ("prompt_kind",)
+))
+RATE_LIMIT_WAIT_SECONDS = metrics.register(Histogram(
+    "contentcube_rate_limiter_wait_seconds", "Time Gemini calls waited for the rate limiter", ("prompt_kind",)
+))
+JOBS_FINISHED = metrics.register(Counter(
+    "contentcube_jobs_finished_total", "Jobs that completed or failed", ("status",)
+))
+
+def timed_stage(stage: str):
+    """Decorator recording an async function's duration (and errors) under the given stage name,
+    both in the metrics and as a span in the current job's trace"""
+    def decorator(func: Callable[..., Awaitable]) -> Callable[..., Awaitable]:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                with trace_span(stage):
+                    return await func(*args, **kwargs)
+            except Exception:
+                STAGE_ERRORS.inc(stage=stage)
+                raise
+            finally:
+                STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage)
+        return wrapper
+    return decorator
+
+def process_rss_bytes() -> float:
+    try:
+        return float(psutil.Process().memory_info().rss)
+    except ImportError:
+        # Linux without psutil: resident pages from /proc
+        with open("/proc/self/statm") as statm:
+            return float(int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE"))
+
+class TokenBucket:
+    """Async token bucket that grants at most `limit` tokens in any `period` seconds.
+    
+    The bucket holds up to `burst` tokens and refills at (limit - burst) / period,
+    so a full bucket plus everything refilled during a period never exceeds the
+    limit. A request larger than the bucket waits for a full bucket and leaves
+    it in debt.
+    """
+    def __init__(self, limit: float, period: float = 60.0, burst: Optional[float] = None):
+        self.limit = limit
+        # At most half the limit, so the other half refills steadily
+        self.capacity = min(limit / 2, max(1.0, limit / 10 if burst is None else burst))
+        self.rate = (limit - self.capacity) / period
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = None  # Created lazily so it binds to the running event loop
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    async def acquire(self, amount: float = 1.0) -> float:
+        """Take `amount` tokens, waiting in FIFO order until they are available. Returns seconds waited."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        
+        needed = min(amount, self.capacity)
+        started = time.monotonic()
+        async with self._lock:
+            self._refill()
+            while self.tokens < needed:
+                await asyncio.sleep((needed - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= amount
+        return time.monotonic() - started
+    
+    def adjust(self, amount: float):
+        """Give back (positive) or charge extra (negative) tokens once the real cost is known"""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+CHARS_PER_TOKEN = 4
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough Gemini token count for text (about four characters per token)"""
+    return len(text) // CHARS_PER_TOKEN
 
 class GeminiRateLimiter:
-    def __init__(self, requests_per_minute: int = 10):  # Reduced for multimedia processing
+    """Concurrency-safe rate limiter for Gemini API calls.
+    
+    Requests and tokens per minute are each tracked with a token bucket that never
+    grants more than the per-minute limit in any 60 seconds, the
+    number of calls in flight is capped, and rate-limit errors are retried with
+    jittered exponential backoff that honors the server's retry delay. Calls go
+    through the SDK's async API (or a worker thread) so the event loop never blocks.
+    """
+    IMAGE_TOKEN_ESTIMATE = 258  # Gemini bills each image as roughly 258 tokens
+    
+    def __init__(
+        self,
+        requests_per_minute: int = 10,  # Reduced for multimedia processing
+        tokens_per_minute: int = 250000,
+        request_burst: Optional[int] = None,
+        token_burst: Optional[int] = None,
+        max_concurrency: int = 4,
+        max_retries: int = 5,
+        base_backoff: float = 2.0,
+        max_backoff: float = 60.0,
+        response_cache: Optional[LLMResponseCache] = None
+    ):
         self.requests_per_minute = requests_per_minute
-        self.request_times = []
+        self.tokens_per_minute = tokens_per_minute
+        self.request_bucket = TokenBucket(requests_per_minute, burst=request_burst)
+        self.token_bucket = TokenBucket(tokens_per_minute, burst=token_burst)
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.response_cache = response_cache
+        self._semaphore = None  # Created lazily so it binds to the running event loop
         
-    async def make_request(self, prompt: str, model_instance: any, image_data: bytes = None) -> str:
-        """Make a rate-limited request to Gemini API with optional image support"""
-        current_time = time.time()
+        # Stats
+        self.waiting = 0
+        self.in_flight = 0
+        self.total_requests = 0
+        self.total_retries = 0
+        self.total_errors = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+    
+    def estimate_tokens(self, prompt: str, image_count: int = 0) -> int:
+        """Rough token count used to pace requests before the real usage is known"""
+        return estimate_text_tokens(prompt) + image_count * self.IMAGE_TOKEN_ESTIMATE
+    
+    async def make_request(self, prompt: str, model_instance: Any,
+                           image_data: Union[bytes, List[bytes], None] = None, use_cache: bool = True,
+                           generation_config: Optional[Dict] = None, image_mime_type: str = "image/jpeg",
+                           prompt_kind: str = "other", parse: Optional[Callable[[str], Any]] = None) -> Any:
+        """Make a rate-limited request to Gemini API with optional image support.
         
-        # Remove requests older than 1 minute
-        self.request_times = [t for t in self.request_times if current_time - t < 60]
+        image_data may be a single image or a list of images sent in one request,
+        all encoded as image_mime_type. prompt_kind labels the call in /metrics.
+        generation_config is passed through to Gemini, e.g. to request JSON output
+        matching a response schema.
+        Responses are served from the response cache when an identical request
+        was made before, and identical concurrent requests share one API call.
+        parse, if given, turns the reply text into the return value; a reply it
+        rejects (by raising) is never cached, so retrying the request calls Gemini again.
+        """
+        images = image_data if isinstance(image_data, list) else ([image_data] if image_data else [])
+        if not use_cache or self.response_cache is None:
+            response_text = await self._make_uncached_request(
+                prompt, model_instance, images, generation_config, image_mime_type, prompt_kind
+            )
+        else:
+            model_name = getattr(model_instance, "model_name", type(model_instance).__name__)
+            key = self.response_cache.make_key(model_name, prompt, images, generation_config)
+            response_text = await self.response_cache.get_or_compute(
+                key, lambda: self._make_uncached_request(
+                    prompt, model_instance, images, generation_config, image_mime_type, prompt_kind
+                ),
+                validate=parse
+            )
+        return parse(response_text) if parse else response_text
+    
+    async def _make_uncached_request(self, prompt: str, model_instance: Any, images: List[bytes],
+                                     generation_config: Optional[Dict] = None,
+                                     image_mime_type: str = "image/jpeg", prompt_kind: str = "other") -> str:
+        if images:
+            # For image analysis with Gemini Vision
+            image_parts = [
+                {"mime_type": image_mime_type, "data": base64.b64encode(image).decode()}
+                for image in images
+            ]
+            contents = [prompt, *image_parts]
+            estimated_tokens = self.estimate_tokens(prompt, len(images))
+        else:
+            contents = prompt
+            estimated_tokens = self.estimate_tokens(prompt)
         
-        # Wait if we've exceeded the rate limit
-        if len(self.request_times) >= self.requests_per_minute:
-            sleep_time = 60 - (current_time - self.request_times[0]) + 1
-            if sleep_time > 0:
-                await asyncio.sleep(sleep_time)
-                current_time = time.time()
-                self.request_times = [t for t in self.request_times if current_time - t < 60]
+        attempt = 0
+        while True:
+            with trace_span("gemini.rate_limit_wait", prompt_kind=prompt_kind, estimated_tokens=estimated_tokens):
+                waited = await self._acquire(estimated_tokens)
+            RATE_LIMIT_WAIT_SECONDS.observe(waited, prompt_kind=prompt_kind)
+            started = time.perf_counter()
+            try:
+                with trace_span("gemini.request", prompt_kind=prompt_kind, attempt=attempt + 1,
+                                images=len(images)) as span:
+                    response = await self._generate(model_instance, contents, generation_config)
+                    span["tokens"] = self._settle_tokens(response, estimated_tokens) or estimated_tokens
+                GEMINI_SECONDS.observe(time.perf_counter() - started, prompt_kind=prompt_kind, outcome="ok")
+                self.total_requests += 1
+                GEMINI_TOKENS.inc(span["tokens"], prompt_kind=prompt_kind)
+                return response.text
+            except Exception as e:
+                rate_limited = self._is_rate_limit_error(e)
+                GEMINI_SECONDS.observe(time.perf_counter() - started, prompt_kind=prompt_kind, outcome="error")
+                GEMINI_ERRORS.inc(prompt_kind=prompt_kind, error="rate_limited" if rate_limited else type(e).__name__)
+                if not rate_limited or attempt >= self.max_retries:
+                    self.total_errors += 1
+                    raise
+                delay = self._backoff_delay(e, attempt)
+                attempt += 1
+                self.total_retries += 1
+                print(f"Gemini rate limited, retry {attempt}/{self.max_retries} in {delay:.1f}s")
+            finally:
+                self.in_flight -= 1
+                self._semaphore.release()
+            await asyncio.sleep(delay)
+    
+    async def _acquire(self, estimated_tokens: int) -> float:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
         
+        self.waiting += 1
+        started = time.monotonic()
         try:
-            # Make the actual request
-            if image_data:
-                # For image analysis with Gemini Vision
-                image_part = {
-                    "mime_type": "image/jpeg",
-                    "data": base64.b64encode(image_data).decode()
-                }
-                response = model_instance.generate_content([prompt, image_part])
-            else:
-                response = model_instance.generate_content(prompt)
-                
-            self.request_times.append(current_time)
-            return response.text
-        except Exception as e:
-            # Handle rate limit errors gracefully
-            if "rate limit" in str(e).lower():
-                await asyncio.sleep(60)  # Wait a minute and retry
-                return await self.make_request(prompt, model_instance, image_data)
-            raise e
+            await self.request_bucket.acquire(1)
+            await self.token_bucket.acquire(estimated_tokens)
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+        
+        waited = time.monotonic() - started
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.in_flight += 1
+        return waited
+    
+    async def _generate(self, model_instance: Any, contents: Any, generation_config: Optional[Dict] = None):
+        kwargs = {"generation_config": generation_config} if generation_config else {}
+        if isinstance(model_instance, LazyGeminiModel) and not model_instance.loaded:
+            # Import and configure the SDK off the event loop
+            await asyncio.to_thread(model_instance.load)
+        if hasattr(model_instance, "generate_content_async"):
+            return await model_instance.generate_content_async(contents, **kwargs)
+        return await asyncio.to_thread(model_instance.generate_content, contents, **kwargs)
+    
+    def _settle_tokens(self, response: Any, estimated_tokens: int) -> int:
+        """Correct the token bucket with the reported usage; returns the actual token count (0 if unknown)"""
+        usage = getattr(response, "usage_metadata", None)
+        actual_tokens = getattr(usage, "total_token_count", 0) if usage else 0
+        if actual_tokens:
+            self.token_bucket.adjust(estimated_tokens - actual_tokens)
+        return actual_tokens
+    
+    @staticmethod
+    def _is_rate_limit_error(error: Exception) -> bool:
+        if isinstance(error, (google_exceptions.ResourceExhausted, google_exceptions.TooManyRequests,
+                              google_exceptions.ServiceUnavailable)):
+            return True
+        message = str(error).lower()
+        return "rate limit" in message or "quota" in message or "429" in message
+    
+    def _backoff_delay(self, error: Exception, attempt: int) -> float:
+        """Server retry hint if present, otherwise full-jitter exponential backoff"""
+        message = str(error)
+        hint = re.search(r"retry_delay\s*\{\s*seconds:\s*(\d+)", message) or \
+            re.search(r"retry in\s*([\d.]+)\s*s", message, re.IGNORECASE)
+        if hint:
+            return float(hint.group(1)) * random.uniform(1.0, 1.2)
+        return random.uniform(0, min(self.max_backoff, self.base_backoff * (2 ** attempt)))
+    
+    def stats(self) -> Dict:
+        return {
+            "requests_per_minute": self.requests_per_minute,
+            "tokens_per_minute": self.tokens_per_minute,
+            "max_concurrency": self.max_concurrency,
+            "queue_depth": self.waiting,
+            "in_flight": self.in_flight,
+            "total_requests": self.total_requests,
+            "total_retries": self.total_retries,
+            "total_errors": self.total_errors,
+            "total_wait_seconds": round(self.total_wait_seconds, 3),
+            "max_wait_seconds": round(self.max_wait_seconds, 3),
+            "avg_wait_seconds": round(self.total_wait_seconds / max(1, self.total_requests + self.total_retries), 3),
+        }
 
 # Global rate limiter instance
-rate_limiter = GeminiRateLimiter()
+rate_limiter = GeminiRateLimiter(
+    requests_per_minute=int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", 10)),
+    tokens_per_minute=int(os.getenv("GEMINI_TOKENS_PER_MINUTE", 250000)),
+    # Requests/tokens that may go out back to back (default a tenth of the per-minute limit)
+    request_burst=int(os.environ["GEMINI_REQUEST_BURST"]) if os.getenv("GEMINI_REQUEST_BURST") else None,
+    token_burst=int(os.environ["GEMINI_TOKEN_BURST"]) if os.getenv("GEMINI_TOKEN_BURST") else None,
+    max_concurrency=int(os.getenv("GEMINI_MAX_CONCURRENCY", 4)),
+    max_retries=int(os.getenv("GEMINI_MAX_RETRIES", 5)),
+    response_cache=llm_response_cache
+)
 
 class ContentRequest(BaseModel):
     title: str
@@ -158,11 +1541,33 @@ class ContentRequest(BaseModel):
 class JobStatus(BaseModel):
     job_id: str
     status: str  # "processing", "completed", "failed"
+    stage: Optional[str] = None  # "queued", "extracting", "generating", "localizing", ...
     progress: int  # 0-100
     result: Optional[Dict] = None
     error: Optional[str] = None
 
-def validate_file(file: UploadFile) -> bool:
+class SummaryContent(BaseModel):
+    summary: str = Field(min_length=1)
+    takeaways: List[str] = Field(min_length=1)
+
+class MCQItem(BaseModel):
+    question: str
+    options: List[str] = Field(min_length=4, max_length=4)
+    correct_answer: str
+    explanation: str
+    bloom_level: str
+
+class MCQSet(BaseModel):
+    mcqs: List[MCQItem] = Field(min_length=1)
+
+class FlashcardItem(BaseModel):
+    front: str
+    back: str
+
+class FlashcardSet(BaseModel):
+    flashcards: List[FlashcardItem] = Field(min_length=1)
+
+def validate_file(file: "StreamedUpload") -> bool:
     """Enhanced file validation for multimedia files"""
     # Check file size
     if hasattr(file, 'size') and file.size and file.size > MAX_FILE_SIZE:
@@ -216,19 +1621,680 @@ def get_file_type(filename: str) -> str:
     
     return 'unknown'
 
-async def extract_text_from_image(image_data: bytes) -> str:
-    """Extract text from image using OCR and AI vision"""
+class StreamedUpload:
+    """A file part of a multipart request, hashed and written to UPLOAD_DIR as it arrives"""
+    def __init__(self, filename: str):
+        self.filename = filename
+        self.path = os.path.join(UPLOAD_DIR, f"{uuid.uuid4()}{os.path.splitext(filename)[1].lower()}")
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.file = None
+    
+    async def write(self, data: bytes):
+        self.size += len(data)
+        if self.size > MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File size exceeds {MAX_FILE_SIZE/1024/1024}MB limit"
+            )
+        self.digest.update(data)
+        if self.file is None:
+            self.file = await aiofiles.open(self.path, "wb")
+        await self.file.write(data)
+    
+    async def close(self):
+        if self.file is None:
+            self.file = await aiofiles.open(self.path, "wb")  # Empty file
+        await self.file.close()
+    
+    @property
+    def file_hash(self) -> str:
+        return self.digest.hexdigest()
+
+class UploadFormParser:
+    """Callbacks for python-multipart's streaming parser.
+    
+    Text fields are collected by name; file parts are validated from their
+    headers and their data queued for the StreamedUpload it belongs to. Empty
+    file inputs (no filename) are skipped.
+    """
+    def __init__(self, max_files: int):
+        self.max_files = max_files
+        self.fields: Dict[str, List[str]] = {}
+        self.uploads: Dict[str, List[StreamedUpload]] = {}
+        self.pending: List[Tuple[StreamedUpload, bytes]] = []
+        self.headers: Dict[bytes, bytes] = {}
+        self.header_name = b""
+        self.header_value = b""
+        self.name = ""
+        self.data = bytearray()
+        self.upload: Optional[StreamedUpload] = None
+        self.skip = False
+    
+    def callbacks(self) -> Dict[str, Callable]:
+        return {name: getattr(self, name) for name in (
+            "on_part_begin", "on_header_field", "on_header_value", "on_header_end",
+            "on_headers_finished", "on_part_data", "on_part_end",
+        )}
+    
+    def on_part_begin(self):
+        self.headers = {}
+        self.data = bytearray()
+        self.upload = None
+        self.skip = False
+    
+    def on_header_field(self, data: bytes, start: int, end: int):
+        self.header_name += data[start:end]
+    
+    def on_header_value(self, data: bytes, start: int, end: int):
+        self.header_value += data[start:end]
+    
+    def on_header_end(self):
+        self.headers[self.header_name.lower()] = self.header_value
+        self.header_name = self.header_value = b""
+    
+    def on_headers_finished(self):
+        _, options = parse_multipart_options(self.headers.get(b"content-disposition", b""))
+        if b"name" not in options:
+            raise HTTPException(status_code=400, detail="Form part without a name")
+        self.name = options[b"name"].decode("utf-8", errors="replace")
+        if b"filename" not in options:
+            return
+        filename = options[b"filename"].decode("utf-8", errors="replace")
+        if not filename:
+            self.skip = True
+            return
+        if sum(len(uploads) for uploads in self.uploads.values()) >= self.max_files:
+            raise HTTPException(status_code=400, detail=f"At most {self.max_files} files per request")
+        self.upload = StreamedUpload(filename)
+        validate_file(self.upload)
+        self.uploads.setdefault(self.name, []).append(self.upload)
+    
+    def on_part_data(self, data: bytes, start: int, end: int):
+        if self.skip:
+            return
+        if self.upload is not None:
+            self.pending.append((self.upload, data[start:end]))
+            return
+        self.data += data[start:end]
+        if len(self.data) > MAX_REQUEST_OVERHEAD:
+            raise HTTPException(status_code=400, detail=f"Form field {self.name} is too large")
+    
+    def on_part_end(self):
+        if self.upload is None and not self.skip:
+            self.fields.setdefault(self.name, []).append(self.data.decode("utf-8", errors="replace"))
+
+@timed_stage("upload")
+async def read_upload_form(request: Request, max_files: int = 1) -> Tuple[Dict[str, List[str]], Dict[str, List[StreamedUpload]]]:
+    """Read a form request, streaming its files straight into UPLOAD_DIR.
+    
+    Returns (text fields, uploads), both as lists of values by field name. Each
+    file is written once, hashed on the way, and the request is rejected as soon
+    as a file passes MAX_FILE_SIZE or the body passes the request limit, whether
+    or not the client sent a Content-Length. Partial files are removed on error.
+    """
+    content_type, options = parse_multipart_options(request.headers.get("content-type", "").encode("latin-1"))
+    if content_type != b"multipart/form-data":
+        form = await request.form()
+        fields: Dict[str, List[str]] = {}
+        for name, value in form.multi_items():
+            if isinstance(value, str):
+                fields.setdefault(name, []).append(value)
+        return fields, {}
+    if not options.get(b"boundary"):
+        raise HTTPException(status_code=400, detail="Multipart request without a boundary")
+    
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+    form = UploadFormParser(max_files)
+    parser = python_multipart.MultipartParser(options[b"boundary"], form.callbacks())
+    limit = request_size_limit(request)
+    received = 0
     try:
-        # Save image temporarily
-        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as temp_file:
-            temp_file.write(image_data)
-            temp_path = temp_file.name
-        
-        # OCR extraction
+        async for chunk in request.stream():
+            received += len(chunk)
+            if received > limit:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"Upload size exceeds {(limit - MAX_REQUEST_OVERHEAD)/1024/1024}MB limit"
+                )
+            parser.write(chunk)
+            pending, form.pending = form.pending, []
+            for upload, data in pending:
+                await upload.write(data)
+        parser.finalize()
+        for uploads in form.uploads.values():
+            for upload in uploads:
+                await upload.close()
+    except BaseException:
+        for uploads in form.uploads.values():
+            for upload in uploads:
+                if upload.file is not None:
+                    await upload.file.close()
+                remove_file(upload.path)
+        raise
+    return form.fields, form.uploads
+
+def remove_uploads(uploads: Dict[str, List[StreamedUpload]], keep: Optional[str] = None):
+    """Delete streamed uploads that no job took over, i.e. all but the one at keep"""
+    for field in uploads.values():
+        for upload in field:
+            if upload.path != keep:
+                remove_file(upload.path)
+
+def form_value(fields: Dict[str, List[str]], name: str, default: Optional[str] = None) -> Optional[str]:
+    values = fields.get(name)
+    return values[-1] if values else default
+
+def form_flag(fields: Dict[str, List[str]], name: str) -> bool:
+    value = (form_value(fields, name) or "false").strip().lower()
+    if value not in ("1", "true", "yes", "on", "0", "false", "no", "off"):
+        raise HTTPException(status_code=400, detail=f"{name} must be true or false")
+    return value in ("1", "true", "yes", "on")
+
+def upload_form_schema(properties: Dict[str, Dict]) -> Dict:
+    """OpenAPI request body for endpoints that read their form with read_upload_form"""
+    return {"requestBody": {"content": {"multipart/form-data": {
+        "schema": {"type": "object", "properties": properties}
+    }}}}
+
+def read_file_bytes(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def remove_file(path: Optional[str]):
+    """Delete a temporary file, ignoring files that are already gone"""
+    if path:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+# CPU-bound work (transcription, OCR, video decoding, document parsing) runs in
+# worker process pools so it never blocks the event loop. Functions submitted to
+# the pools must live at module level so they can be pickled.
+_worker_whisper_model = None
+
+def _init_transcription_worker():
+    """Load Whisper once per transcription worker process"""
+    global _worker_whisper_model
+    try:
+        _worker_whisper_model = whisper.load_model(WHISPER_MODEL_NAME, device="cpu")
+    except Exception as e:
+        print(f"Warning: Whisper model not loaded in worker {os.getpid()}: {e}")
+        return
+    if WHISPER_INT8:
         try:
-            ocr_text = pytesseract.image_to_string(Image.open(temp_path))
-        except:
-            ocr_text = ""
+            _worker_whisper_model = quantize_whisper_int8(_worker_whisper_model)
+        except Exception as e:
+            print(f"Warning: WHISPER_INT8 is set but Whisper could not be quantized, using fp32: {e}")
+
+def quantize_whisper_int8(model: Any) -> Any:
+    """Dynamic int8 quantization of Whisper's linear layers for faster CPU inference.
+    
+    quantize_dynamic matches exact module types, and Whisper builds its projections
+    from its own whisper.model.Linear subclass, so those are turned into plain
+    nn.Linear first (on CPU in fp32 both compute the same). Raises when no layer
+    ended up quantized.
+    """
+    import torch
+    from whisper.model import Linear as WhisperLinear
+    for module in model.modules():
+        if type(module) is WhisperLinear:
+            module.__class__ = torch.nn.Linear
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    if not any(isinstance(module, torch.ao.nn.quantized.dynamic.Linear) for module in model.modules()):
+        raise RuntimeError("no linear layer was quantized")
+    return model
+
+class SpeechSegmenter:
+    """Streaming energy-based voice activity detection that splits audio at silences.
+    
+    Feed it decoded samples chunk by chunk; it hands back (start seconds, samples)
+    segments of about target_seconds as soon as they are final, cut in the middle
+    of pauses of at least min_silence_seconds where possible (never beyond 1.5x
+    the target). Pauses are frames quieter than 3x the quietest frames heard so
+    far; that relative threshold only places cuts. Every segment is transcribed
+    unless it stays below the absolute VAD_SILENCE_FLOOR_DBFS level throughout, so
+    audio without quiet stretches is still covered in full.
+    """
+    def __init__(self, sample_rate: int, target_seconds: float, min_silence_seconds: float):
+        self.frame_length = int(sample_rate * 0.03)  # 30ms analysis frames
+        self.frame_seconds = self.frame_length / sample_rate
+        self.target_frames = max(2, int(target_seconds / self.frame_seconds))
+        self.min_silence_frames = max(1, int(min_silence_seconds / self.frame_seconds))
+        self.silence_floor = 10 ** (VAD_SILENCE_FLOOR_DBFS / 20)
+        self.energy_history: List["np.ndarray"] = []
+        self.pending = np.zeros(0, dtype=np.float32)  # samples of whole frames not yet in a segment
+        self.pending_energy = np.zeros(0)
+        self.pending_start = 0  # index of the first pending frame
+        self.remainder = np.zeros(0, dtype=np.float32)  # trailing samples short of a whole frame
+    
+    def feed(self, samples: "np.ndarray") -> List[Tuple[float, "np.ndarray"]]:
+        data = np.concatenate([self.remainder, samples]) if len(self.remainder) else samples
+        frame_count = len(data) // self.frame_length
+        whole = data[:frame_count * self.frame_length]
+        self.remainder = data[len(whole):]
+        if frame_count:
+            energy = np.sqrt(np.mean(whole.reshape(frame_count, self.frame_length) ** 2, axis=1))
+            self.energy_history.append(energy)
+            self.pending = np.concatenate([self.pending, whole])
+            self.pending_energy = np.concatenate([self.pending_energy, energy])
+        
+        segments = []
+        # Past 1.5x the target, every cut point the next segment could use has been heard
+        while len(self.pending_energy) >= self.target_frames * 1.5:
+            segments.extend(self._cut(final=False))
+        return segments
+    
+    def flush(self) -> List[Tuple[float, "np.ndarray"]]:
+        """Segments for the rest of the audio, once the stream has ended"""
+        segments = []
+        while len(self.pending_energy):
+            segments.extend(self._cut(final=True))
+        return segments
+    
+    def _cut(self, final: bool) -> List[Tuple[float, "np.ndarray"]]:
+        energy_so_far = np.concatenate(self.energy_history)
+        threshold = max(np.percentile(energy_so_far, 10) * 3, 1e-3)
+        voiced = self.pending_energy > threshold
+        
+        # Candidate cut points: the middle of every finished, sufficiently long run of silence
+        cut_points = []
+        run_start = None
+        for index, is_voiced in enumerate(np.append(voiced, True) if final else voiced):
+            if not is_voiced and run_start is None:
+                run_start = index
+            elif is_voiced and run_start is not None:
+                if index - run_start >= self.min_silence_frames:
+                    cut_points.append((run_start + index) // 2)
+                run_start = None
+        
+        target = self.target_frames
+        # Prefer the last pause before the target length, but never exceed 1.5x the target
+        in_range = [cut for cut in cut_points if target / 2 <= cut <= target]
+        if in_range:
+            end = in_range[-1]
+        else:
+            later = [cut for cut in cut_points if target < cut <= target * 1.5]
+            end = later[0] if later else target
+        end = max(1, min(end, len(voiced)))
+        
+        samples = self.pending[:end * self.frame_length]
+        if final and end == len(voiced) and len(self.remainder):
+            samples = np.concatenate([samples, self.remainder])
+        start_seconds = self.pending_start * self.frame_seconds
+        has_sound = bool(self.pending_energy[:end].max() > self.silence_floor)
+        
+        self.pending = self.pending[end * self.frame_length:]
+        self.pending_energy = self.pending_energy[end:]
+        self.pending_start += end
+        return [(start_seconds, samples)] if has_sound else []
+
+def _transcribe_samples_in_worker(samples: "np.ndarray", start: float) -> Optional[List[tuple]]:
+    """Transcribe one segment of decoded samples; returns (start, end, text) pieces on the
+    file's timeline, or None without Whisper"""
+    if _worker_whisper_model is None:
+        return None
+    result = _worker_whisper_model.transcribe(samples, fp16=False)
+    return [
+        (start + piece["start"], start + piece["end"], piece["text"].strip())
+        for piece in result.get("segments", [])
+    ]
+
+def _otsu_threshold(gray: Image.Image) -> int:
+    """Grey level that best separates dark text from light background (Otsu's method)"""
+    histogram = gray.histogram()[:256]
+    total = sum(histogram)
+    sum_all = sum(level * count for level, count in enumerate(histogram))
+    best_threshold, best_variance = 128, -1.0
+    weight_background, sum_background = 0, 0
+    for level, count in enumerate(histogram):
+        weight_background += count
+        weight_foreground = total - weight_background
+        if weight_background == 0:
+            continue
+        if weight_foreground == 0:
+            break
+        sum_background += level * count
+        mean_background = sum_background / weight_background
+        mean_foreground = (sum_all - sum_background) / weight_foreground
+        variance = weight_background * weight_foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+    return best_threshold
+
+def _estimate_skew(binary: Image.Image, max_angle: float = 10.0, step: float = 0.5) -> float:
+    """Rotation in degrees that straightens text lines.
+    
+    Tries angles on a thumbnail and keeps the one whose rows of dark pixels are
+    most uneven, i.e. where text lines and the gaps between them line up.
+    """
+    thumbnail = binary.copy()
+    thumbnail.thumbnail((800, 800))
+    best_angle, best_score = 0.0, -1.0
+    for i in range(int(2 * max_angle / step) + 1):
+        angle = -max_angle + i * step
+        rotated = thumbnail.rotate(angle, expand=True, fillcolor=255)
+        row_ink = (np.asarray(rotated) < 128).sum(axis=1).astype(np.float64)
+        score = float(np.square(np.diff(row_ink)).sum())
+        if score > best_score:
+            best_angle, best_score = angle, score
+    return best_angle
+
+def _prepare_image_for_ocr(image: Image.Image, max_dimension: int) -> Image.Image:
+    """Grayscale, contrast-stretched, binarized and deskewed copy of the image"""
+    gray = ImageOps.grayscale(image)
+    gray.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    gray = ImageEnhance.Contrast(ImageOps.autocontrast(gray)).enhance(1.5)
+    threshold = _otsu_threshold(gray)
+    binary = gray.point(lambda level: 255 if level > threshold else 0)
+    angle = _estimate_skew(binary)
+    if abs(angle) >= 0.5:
+        binary = binary.rotate(angle, expand=True, fillcolor=255, resample=Image.BICUBIC)
+    return binary
+
+def _encode_image_for_vision(image: Image.Image, max_dimension: int) -> Tuple[bytes, str]:
+    """Downscaled image bytes and MIME type: PNG for flat-colour images such as screenshots
+    and diagrams (keeps text sharp), JPEG for photos"""
+    flat_colour = image.mode in ("1", "P") or image.getcolors(256) is not None
+    if image.mode in ("RGBA", "LA") or "transparency" in image.info:
+        rgba = image.convert("RGBA")
+        image = Image.new("RGB", rgba.size, "white")
+        image.paste(rgba, mask=rgba.getchannel("A"))
+    image = image.convert("RGB")
+    image.thumbnail((max_dimension, max_dimension), Image.LANCZOS)
+    
+    output = io.BytesIO()
+    if flat_colour:
+        image.save(output, format="PNG", optimize=True)
+        return output.getvalue(), "image/png"
+    image.save(output, format="JPEG", quality=85)
+    return output.getvalue(), "image/jpeg"
+
+def _prepare_image_in_worker(image_path: str, max_dimension: int, ocr_max_dimension: int) -> Tuple[str, bytes, str]:
+    """Decode an uploaded image once and return (OCR text, vision image bytes, MIME type).
+    
+    Any format PIL reads is accepted (multi-frame GIF/TIFF use the first frame)
+    and EXIF rotation is applied. OCR runs on a binarized, deskewed copy; when
+    Tesseract is unavailable the OCR text is empty.
+    """
+    with Image.open(image_path) as opened:
+        opened.seek(0)
+        image = ImageOps.exif_transpose(opened)
+        image.load()
+    
+    try:
+        ocr_text = pytesseract.image_to_string(_prepare_image_for_ocr(image, ocr_max_dimension))
+    except Exception as e:
+        print(f"OCR failed for {os.path.basename(image_path)}: {e}")
+        ocr_text = ""
+    
+    vision_image, mime_type = _encode_image_for_vision(image, max_dimension)
+    return ocr_text, vision_image, mime_type
+
+def _dhash(gray_frame: "np.ndarray") -> int:
+    """64-bit difference hash: one bit per horizontally adjacent pixel pair of a 9x8 thumbnail"""
+    thumbnail = cv2.resize(gray_frame, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (thumbnail[:, 1:] > thumbnail[:, :-1]).flatten()
+    return int("".join("1" if bit else "0" for bit in bits), 2)
+
+def _select_keyframes_in_worker(video_path: str, sample_fps: float, scene_threshold: float,
+                                hash_distance: int, max_frames: int, max_dimension: int,
+                                key_only: bool = True) -> List[tuple]:
+    """Pick informative key frames as (frame number, timestamp seconds, JPEG bytes).
+    
+    ffmpeg resamples the video to sample_fps frames per second, downscaled so the
+    longest side is at most max_dimension pixels, and pipes them as raw BGR frames;
+    with key_only it decodes nothing but the stream's key frames, and each sample
+    shows the latest key frame. A sample is a candidate when its colour histogram
+    differs from the previous sample by more than scene_threshold (Bhattacharyya
+    distance), and candidates within hash_distance bits of an already kept
+    frame's perceptual hash are dropped as near-duplicates. The max_frames
+    candidates with the largest scene changes are returned in playback order.
+    """
+    info = ffmpeg.probe(video_path, select_streams="v:0")
+    if not info.get("streams"):
+        return []
+    stream = info["streams"][0]
+    numerator, _, denominator = stream.get("avg_frame_rate", "0/0").partition("/")
+    fps = float(numerator) / float(denominator) if float(denominator or 0) and float(numerator) else 25.0
+    width, height = int(stream["width"]), int(stream["height"])
+    scale = min(1.0, max_dimension / max(width, height))
+    width, height = max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
+    
+    input_args = {"skip_frame": "nokey"} if key_only else {}
+    args = (
+        ffmpeg.input(video_path, **input_args)
+        .filter("fps", fps=sample_fps)
+        .filter("scale", width, height, flags="area")
+        .output("-", format="rawvideo", pix_fmt="bgr24", an=None)
+        .compile(cmd=["ffmpeg", "-nostdin", "-loglevel", "error"])
+    )
+    process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    frame_bytes = width * height * 3
+    candidates = []  # (scene score, frame number, timestamp, JPEG bytes)
+    kept_hashes = []
+    try:
+        previous_hist = None
+        sample = -1
+        while True:
+            data = process.stdout.read(frame_bytes)
+            if len(data) < frame_bytes:
+                break
+            sample += 1
+            frame = np.frombuffer(data, dtype=np.uint8).reshape(height, width, 3)
+            
+            hsv = cv2.cvtColor(frame, cv2.COLOR_BGR2HSV)
+            hist = cv2.calcHist([hsv], [0, 1], None, [32, 32], [0, 180, 0, 256])
+            cv2.normalize(hist, hist)
+            score = 1.0 if previous_hist is None else cv2.compareHist(previous_hist, hist, cv2.HISTCMP_BHATTACHARYYA)
+            previous_hist = hist
+            if score < scene_threshold:
+                continue
+            
+            frame_hash = _dhash(cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY))
+            if any(bin(frame_hash ^ kept).count("1") <= hash_distance for kept in kept_hashes):
+                continue
+            kept_hashes.append(frame_hash)
+            
+            timestamp = sample / sample_fps
+            _, buffer = cv2.imencode('.jpg', frame, [cv2.IMWRITE_JPEG_QUALITY, 85])
+            candidates.append((score, int(round(timestamp * fps)), timestamp, buffer.tobytes()))
+            
+            # Bound memory on long videos by keeping only the strongest candidates
+            if len(candidates) > max_frames * 4:
+                candidates = sorted(candidates, key=lambda c: c[0], reverse=True)[:max_frames * 2]
+    finally:
+        process.stdout.close()
+        if process.poll() is None:
+            process.kill()
+        process.wait()
+    
+    selected = sorted(candidates, key=lambda c: c[0], reverse=True)[:max_frames]
+    return [(frame_num, timestamp, jpeg) for _, frame_num, timestamp, jpeg in sorted(selected, key=lambda c: c[1])]
+
+@contextlib.contextmanager
+def _open_pdf_in_worker(file_path: str):
+    """PdfReader over an open file for the length of one call.
+    
+    Given a path, PdfReader would copy the whole file into memory; reading from
+    the file object keeps only the parsed objects, and both go when the call ends.
+    """
+    with open(file_path, "rb") as pdf_file:
+        yield PyPDF2.PdfReader(pdf_file)
+
+def _count_pdf_pages_in_worker(file_path: str) -> int:
+    with _open_pdf_in_worker(file_path) as reader:
+        return len(reader.pages)
+
+def _extract_pdf_pages_in_worker(file_path: str, page_numbers: List[int]) -> List[tuple]:
+    """(page_number, text, seconds) for each page; unreadable pages come back empty"""
+    pages = []
+    with _open_pdf_in_worker(file_path) as reader:
+        for page_num in page_numbers:
+            started = time.perf_counter()
+            try:
+                page_text = reader.pages[page_num].extract_text() or ""
+            except Exception as e:
+                print(f"Error extracting page {page_num + 1}: {e}")
+                page_text = ""
+            pages.append((page_num, page_text, time.perf_counter() - started))
+    return pages
+
+def _extract_docx_in_worker(file_path: str) -> str:
+    doc = docx.Document(file_path)
+    text_parts = []
+    
+    for paragraph in doc.paragraphs:
+        if paragraph.text.strip():
+            text_parts.append(paragraph.text.strip())
+    
+    for table in doc.tables:
+        for row in table.rows:
+            row_text = []
+            for cell in row.cells:
+                if cell.text.strip():
+                    row_text.append(cell.text.strip())
+            if row_text:
+                text_parts.append(" | ".join(row_text))
+    
+    if not text_parts:
+        raise ValueError("No readable text found in DOCX")
+    
+    return "\n\n".join(text_parts)
+
+def _worker_status() -> Dict:
+    return {"pid": os.getpid(), "whisper_loaded": _worker_whisper_model is not None}
+
+class CPUWorkerPools:
+    """Process pools for CPU-bound work, one per task type.
+    
+    Pools are created on first use (or by warm_up) with a configurable number of
+    worker processes. Each pool can have an initializer, e.g. to load Whisper
+    once per transcription worker rather than once per call.
+    """
+    def __init__(self, workers_per_task: Dict[str, int], initializers: Dict[str, Callable] = None,
+                 start_method: str = "spawn"):
+        self.workers_per_task = workers_per_task
+        self.initializers = initializers or {}
+        self.context = multiprocessing.get_context(start_method)
+        self.pools: Dict[str, ProcessPoolExecutor] = {}
+        self.warmed: Dict[str, List[Dict]] = {}
+    
+    def get(self, task: str) -> ProcessPoolExecutor:
+        if task not in self.pools:
+            self.pools[task] = ProcessPoolExecutor(
+                max_workers=max(1, self.workers_per_task.get(task, 1)),
+                mp_context=self.context,
+                initializer=self.initializers.get(task)
+            )
+        return self.pools[task]
+    
+    async def run(self, task: str, func: Callable, *args) -> Any:
+        """Run func(*args) in the task's process pool without blocking the event loop.
+        
+        The call is a span in the current job's trace; when the job is being
+        profiled, the worker samples its own stack and the samples are merged in.
+        """
+        loop = asyncio.get_running_loop()
+        with trace_span(f"pool.{task}", function=func.__name__):
+            profiler = current_profiler.get()
+            if profiler is None:
+                return await loop.run_in_executor(self.get(task), func, *args)
+            result, stacks = await loop.run_in_executor(
+                self.get(task), _run_sampled_in_worker, profiler.interval, func, *args
+            )
+            profiler.add_worker_samples(task, stacks)
+            return result
+    
+    async def warm_up(self, tasks: List[str] = None):
+        """Start every worker process (running its initializer) ahead of the first job"""
+        for task in tasks or list(self.workers_per_task):
+            statuses = await asyncio.gather(*[
+                self.run(task, _worker_status)
+                for _ in range(max(1, self.workers_per_task.get(task, 1)))
+            ], return_exceptions=True)
+            self.warmed[task] = [status for status in statuses if isinstance(status, dict)]
+    
+    def status(self) -> Dict:
+        return {
+            task: {
+                "workers": max(1, count),
+                "started": task in self.pools,
+                "warmed": task in self.warmed,
+                **({"whisper_loaded": any(s["whisper_loaded"] for s in self.warmed[task])}
+                   if task == "transcription" and task in self.warmed else {}),
+            }
+            for task, count in self.workers_per_task.items()
+        }
+    
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
+        self.pools = {}
+        self.warmed = {}
+
+# Global CPU worker pools
+cpu_pools = CPUWorkerPools(
+    CPU_WORKERS_PER_TASK,
+    initializers={"transcription": _init_transcription_worker},
+    start_method=CPU_POOL_START_METHOD
+)
+
+# Libraries used in the API process and worker pools used by each modality
+MODALITY_ENGINES = {
+    "document": {"modules": [PyPDF2, docx], "pools": ["document"]},
+    "image": {"modules": [pytesseract, np], "pools": ["ocr"]},
+    "audio": {"modules": [ffmpeg, sr], "pools": ["transcription"]},
+    "video": {"modules": [cv2, ffmpeg], "pools": ["video", "transcription"]},
+    "youtube": {"modules": [yt_dlp], "pools": ["video", "transcription"]},
+}
+
+async def warm_up_modalities(modalities: List[str]):
+    """Import a modality's libraries and start its worker pools ahead of the first job"""
+    if isinstance(model, LazyGeminiModel):
+        await asyncio.to_thread(model.load)
+    for modality in modalities:
+        engines = MODALITY_ENGINES.get(modality)
+        if not engines:
+            print(f"Warning: unknown modality '{modality}' in WARMUP_MODALITIES")
+            continue
+        for module in engines["modules"]:
+            try:
+                await asyncio.to_thread(module.load)
+            except ImportError as e:
+                print(f"Warning: {module.module_name} could not be imported: {e}")
+        await cpu_pools.warm_up(engines["pools"])
+
+def engine_status() -> Dict:
+    return {
+        "gemini": model.loaded if isinstance(model, LazyGeminiModel) else True,
+        "modules": {
+            module.module_name: module.loaded
+            for engines in MODALITY_ENGINES.values()
+            for module in engines["modules"]
+        },
+        "worker_pools": cpu_pools.status(),
+    }
+
+@timed_stage("extract_image")
+async def extract_text_from_image(image_path: str) -> str:
+    """Extract text from image using OCR and AI vision.
+    
+    The image is decoded and preprocessed once in an OCR worker process. Vision
+    gets a downscaled copy and is skipped when OCR alone found at least
+    IMAGE_SKIP_VISION_OCR_CHARS characters of text.
+    """
+    try:
+        ocr_text, vision_image, mime_type = await cpu_pools.run(
+            "ocr", _prepare_image_in_worker, image_path, IMAGE_MAX_DIMENSION, OCR_MAX_DIMENSION
+        )
+        
+        if IMAGE_SKIP_VISION_OCR_CHARS and len(re.sub(r"\s+", "", ocr_text)) >= IMAGE_SKIP_VISION_OCR_CHARS:
+            return f"""
+        OCR Extracted Text:
+        {ocr_text.strip()}
+        """.strip()
         
         # AI Vision analysis
         vision_prompt = """
@@ -242,8 +2308,11 @@ async def extract_text_from_image(image_data: bytes) -> str:
         """
         
         try:
-            ai_description = await rate_limiter.make_request(vision_prompt, model, image_data)
-        except:
+            ai_description = await rate_limiter.make_request(
+                vision_prompt, model, vision_image, image_mime_type=mime_type, prompt_kind="vision_image"
+            )
+        except Exception:
+            record_fallback("vision")
             ai_description = "AI vision analysis not available"
         
         # Combine OCR and AI analysis
@@ -255,119 +2324,261 @@ async def extract_text_from_image(image_data: bytes) -> str:
         {ai_description}
         """
         
-        # Clean up temp file
-        os.unlink(temp_path)
-        
         return combined_text.strip()
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing image: {str(e)}")
 
-async def extract_text_from_audio(audio_data: bytes, filename: str) -> str:
+async def decode_audio_stream(path: str, chunk_seconds: float = AUDIO_DECODE_CHUNK_SECONDS) -> AsyncIterator["np.ndarray"]:
+    """Decode the audio of any audio or video container to 16 kHz mono float32 chunks.
+    
+    ffmpeg decodes in its own process and writes raw samples to a pipe, which is read
+    chunk by chunk without blocking the event loop; nothing is written to disk.
+    """
+    args = (
+        ffmpeg.input(path)
+        .output("-", format="f32le", acodec="pcm_f32le", ac=1, ar=WHISPER_SAMPLE_RATE, vn=None)
+        .compile(cmd=["ffmpeg", "-nostdin", "-loglevel", "error"])
+    )
+    process = await asyncio.create_subprocess_exec(
+        *args, stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.PIPE
+    )
+    errors = asyncio.create_task(process.stderr.read())  # drained alongside so ffmpeg never blocks on it
+    chunk_bytes = max(1, int(chunk_seconds * WHISPER_SAMPLE_RATE)) * 4
+    try:
+        while True:
+            try:
+                data = await process.stdout.readexactly(chunk_bytes)
+            except asyncio.IncompleteReadError as e:
+                data = e.partial
+            if len(data) >= 4:
+                yield np.frombuffer(data[:len(data) // 4 * 4], dtype=np.float32)
+            if len(data) < chunk_bytes:
+                break
+        if await process.wait() != 0:
+            message = (await errors).decode(errors="replace").strip()
+            raise RuntimeError(f"ffmpeg could not decode {os.path.basename(path)}: {message[-300:]}")
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+        errors.cancel()
+
+async def decode_audio(path: str) -> "np.ndarray":
+    """The whole audio of a file as one 16 kHz mono float32 array"""
+    chunks = [chunk async for chunk in decode_audio_stream(path)]
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=np.float32)
+
+async def has_audio_stream(path: str) -> bool:
+    """Whether a media file contains at least one audio stream (reads only the headers)"""
+    info = await asyncio.to_thread(ffmpeg.probe, path, select_streams="a")
+    return bool(info.get("streams"))
+
+@timed_stage("transcription")
+async def transcribe_audio_file(path: str) -> Optional[str]:
+    """Transcribe the audio of an audio or video file with Whisper.
+    
+    Audio is decoded as a stream and split at pauses by voice activity detection;
+    each segment goes to a transcription worker as soon as it is cut, so Whisper
+    starts on the beginning of a long file while the rest is still decoding.
+    Pieces are stitched back together in timeline order. Job progress is reported
+    as segments finish. Returns None when Whisper is unavailable.
+    """
+    segmenter = SpeechSegmenter(WHISPER_SAMPLE_RATE, TRANSCRIPTION_SEGMENT_SECONDS, VAD_MIN_SILENCE_SECONDS)
+    tasks: List[asyncio.Task] = []
+    completed = 0
+    decoded = False
+    
+    async def transcribe_segment(start: float, samples: "np.ndarray"):
+        nonlocal completed
+        end = start + len(samples) / WHISPER_SAMPLE_RATE
+        pieces = await cpu_pools.run("transcription", _transcribe_samples_in_worker, samples, start)
+        completed += 1
+        # Until decoding finishes the segment count is still growing, so only half the range is used
+        fraction = completed / len(tasks) if decoded else completed / len(tasks) / 2
+        await report_extraction_progress(
+            "transcribing", fraction,
+            segment={"start": round(start, 2), "end": round(end, 2)}, completed=completed,
+            total=len(tasks) if decoded else None
+        )
+        return pieces
+    
+    try:
+        with trace_span("audio.decode") as span:
+            seconds = 0.0
+            async for chunk in decode_audio_stream(path):
+                seconds += len(chunk) / WHISPER_SAMPLE_RATE
+                for start, samples in segmenter.feed(chunk):
+                    tasks.append(asyncio.create_task(transcribe_segment(start, samples)))
+            for start, samples in segmenter.flush():
+                tasks.append(asyncio.create_task(transcribe_segment(start, samples)))
+            decoded = True
+            span.update(seconds=round(seconds, 2), segments=len(tasks))
+        results = await asyncio.gather(*tasks)
+    except BaseException:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        raise
+    
+    if not results:
+        return ""
+    if any(pieces is None for pieces in results):
+        return None
+    
+    pieces = sorted(piece for segment_pieces in results for piece in segment_pieces)
+    return " ".join(text for _, _, text in pieces if text)
+
+def wav_bytes(samples: "np.ndarray", sample_rate: int = WHISPER_SAMPLE_RATE) -> bytes:
+    """16-bit mono WAV file contents for float samples in [-1, 1]"""
+    pcm = (np.clip(samples, -1.0, 1.0) * 32767).astype("<i2")
+    output = io.BytesIO()
+    with wave.open(output, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm.tobytes())
+    return output.getvalue()
+
+def _recognize_speech_google(wav_data: bytes) -> str:
+    """Fallback transcription through speech_recognition (blocking, run in a thread)"""
+    r = sr.Recognizer()
+    with sr.AudioFile(io.BytesIO(wav_data)) as source:
+        audio_data = r.record(source)
+        return r.recognize_google(audio_data)
+
+@timed_stage("extract_audio")
+async def extract_text_from_audio(audio_path: str) -> str:
     """Extract text from audio using speech recognition"""
     try:
-        # Save audio temporarily
-        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1], delete=False) as temp_file:
-            temp_file.write(audio_data)
-            temp_path = temp_file.name
-        
         transcript = ""
         
         # Try Whisper first (more accurate)
-        if whisper_model:
-            try:
-                result = whisper_model.transcribe(temp_path)
-                transcript = result["text"]
-            except Exception as e:
-                print(f"Whisper transcription failed: {e}")
+        try:
+            transcript = await transcribe_audio_file(audio_path) or ""
+        except Exception as e:
+            print(f"Whisper transcription failed: {e}")
         
-        # Fallback to speech_recognition
+        # Fallback to speech_recognition, fed an in-memory WAV
         if not transcript.strip():
             try:
-                # Convert to WAV if needed
-                audio = AudioSegment.from_file(temp_path)
-                wav_path = temp_path.replace(os.path.splitext(temp_path)[1], '.wav')
-                audio.export(wav_path, format="wav")
-                
-                r = sr.Recognizer()
-                with sr.AudioFile(wav_path) as source:
-                    audio_data = r.record(source)
-                    transcript = r.recognize_google(audio_data)
-                
-                if wav_path != temp_path:
-                    os.unlink(wav_path)
-                    
+                wav_data = wav_bytes(await decode_audio(audio_path))
+                transcript = await asyncio.to_thread(_recognize_speech_google, wav_data)
             except Exception as e:
+                record_fallback("transcription")
                 transcript = f"Audio transcription failed: {str(e)}"
         
-        # Clean up temp file
-        os.unlink(temp_path)
-        
         return transcript if transcript.strip() else "No speech detected in audio file"
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing audio: {str(e)}")
 
-async def extract_text_from_video(video_data: bytes, filename: str) -> str:
-    """Extract text from video (audio track + key frames)"""
-    try:
-        # Save video temporarily
-        with tempfile.NamedTemporaryFile(suffix=os.path.splitext(filename)[1], delete=False) as temp_file:
-            temp_file.write(video_data)
-            temp_path = temp_file.name
+def parse_json_response(response_text: str) -> Any:
+    """Parse a JSON reply from Gemini, stripping Markdown code fences"""
+    content = response_text.strip()
+    content = re.sub(r'```json\n?', '', content)
+    content = re.sub(r'```\n?', '', content)
+    return json.loads(content)
+
+@timed_stage("describe_frames")
+async def describe_video_frames(frames: List[tuple]) -> Dict[int, str]:
+    """Describe key frames with batched multi-image Gemini requests.
+    
+    Frames are sent VISION_BATCH_SIZE at a time with a prompt asking for one
+    description per frame as JSON. A batch that fails or comes back incomplete is
+    split in half and retried, down to single frames. Returns descriptions keyed
+    by frame number; frames that could not be described are left out.
+    """
+    descriptions: Dict[int, str] = {}
+    
+    async def describe_batch(batch: List[tuple]):
+        if len(batch) == 1:
+            frame_num, _, frame_bytes = batch[0]
+            frame_prompt = "Briefly describe the educational content visible in this video frame."
+            try:
+                descriptions[frame_num] = await rate_limiter.make_request(
+                    frame_prompt, model, frame_bytes, prompt_kind="vision_frames"
+                )
+            except Exception as e:
+                record_fallback("vision")
+                print(f"Frame {frame_num} analysis failed: {e}")
+            return
+        
+        batch_prompt = f"""
+The {len(batch)} attached images are frames from an educational video, in playback order.
+Briefly describe the educational content visible in each frame.
+
+Respond with a JSON array containing exactly one object per frame:
+[
+    {{"frame": 1, "description": "What frame 1 shows"}}
+]
+"""
+        def parse_descriptions(response_text: str) -> Dict[int, str]:
+            batch_descriptions = {
+                int(item["frame"]): str(item["description"])
+                for item in parse_json_response(response_text)
+            }
+            if not all(index in batch_descriptions for index in range(1, len(batch) + 1)):
+                raise ValueError("response does not describe every frame")
+            return batch_descriptions
         
-        # Extract audio and transcribe
         try:
-            video = VideoFileClip(temp_path)
-            audio_path = temp_path.replace(os.path.splitext(temp_path)[1], '.wav')
-            
-            if video.audio:
-                video.audio.write_audiofile(audio_path, verbose=False, logger=None)
-                
-                # Transcribe audio
-                if whisper_model:
-                    result = whisper_model.transcribe(audio_path)
-                    transcript = result["text"]
-                else:
-                    transcript = "Audio transcription not available"
-                
-                os.unlink(audio_path)
-            else:
-                transcript = "No audio track found in video"
-            
-            video.close()
-            
+            batch_descriptions = await rate_limiter.make_request(
+                batch_prompt, model, [frame[2] for frame in batch], prompt_kind="vision_frames",
+                parse=parse_descriptions
+            )
+            for index, (frame_num, _, _) in enumerate(batch, start=1):
+                descriptions[frame_num] = batch_descriptions[index]
         except Exception as e:
-            transcript = f"Video processing failed: {str(e)}"
+            print(f"Batched analysis of {len(batch)} frames failed, splitting batch: {e}")
+            middle = len(batch) // 2
+            await asyncio.gather(describe_batch(batch[:middle]), describe_batch(batch[middle:]))
+    
+    batches = [frames[i:i + VISION_BATCH_SIZE] for i in range(0, len(frames), max(1, VISION_BATCH_SIZE))]
+    await asyncio.gather(*[describe_batch(batch) for batch in batches])
+    return descriptions
+
+@timed_stage("extract_video")
+async def extract_text_from_video(video_path: str) -> str:
+    """Extract text from video (audio track + key frames).
+    
+    The audio track is decoded straight from the video and transcribed while key
+    frames are selected and described, so the two halves run concurrently.
+    """
+    try:
+        async def transcribe_video_audio() -> str:
+            try:
+                if not await has_audio_stream(video_path):
+                    return "No audio track found in video"
+                transcript = await transcribe_audio_file(video_path)
+                if transcript is None:
+                    record_fallback("transcription")
+                    return "Audio transcription not available"
+                return transcript
+            except Exception as e:
+                record_fallback("transcription")
+                return f"Video processing failed: {str(e)}"
         
         # Extract key frames for visual analysis (optional)
-        visual_info = ""
-        try:
-            cap = cv2.VideoCapture(temp_path)
-            frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-            
-            # Extract a few key frames
-            key_frames = [0, frame_count // 4, frame_count // 2, 3 * frame_count // 4, frame_count - 1]
-            
-            for frame_num in key_frames:
-                cap.set(cv2.CAP_PROP_POS_FRAMES, frame_num)
-                ret, frame = cap.read()
-                if ret:
-                    # Convert frame to bytes for analysis
-                    _, buffer = cv2.imencode('.jpg', frame)
-                    frame_bytes = buffer.tobytes()
-                    
-                    # Quick AI analysis of frame
-                    frame_prompt = "Briefly describe the educational content visible in this video frame."
-                    try:
-                        frame_analysis = await rate_limiter.make_request(frame_prompt, model, frame_bytes)
-                        visual_info += f"Frame {frame_num}: {frame_analysis}\n"
-                    except:
-                        break  # Stop if rate limited
-            
-            cap.release()
-        except Exception as e:
-            visual_info = "Visual analysis not available"
+        async def describe_key_frames() -> str:
+            visual_info = ""
+            try:
+                frames = await cpu_pools.run(
+                    "video", _select_keyframes_in_worker, video_path,
+                    KEYFRAME_SAMPLE_FPS, KEYFRAME_SCENE_THRESHOLD, KEYFRAME_HASH_DISTANCE, KEYFRAME_MAX_FRAMES,
+                    VISION_MAX_DIMENSION, KEYFRAME_DECODE_KEY_ONLY
+                )
+                
+                descriptions = await describe_video_frames(frames)
+                for frame_num, timestamp, _ in frames:
+                    if frame_num in descriptions:
+                        visual_info += f"Frame {frame_num} ({int(timestamp) // 60}:{int(timestamp) % 60:02d}): {descriptions[frame_num]}\n"
+            except Exception as e:
+                record_fallback("vision")
+                visual_info = "Visual analysis not available"
+            return visual_info
+        
+        transcript, visual_info = await asyncio.gather(transcribe_video_audio(), describe_key_frames())
         
         combined_content = f"""
         Video Transcript:
@@ -377,61 +2588,122 @@ async def extract_text_from_video(video_data: bytes, filename: str) -> str:
         {visual_info if visual_info.strip() else "Visual analysis not performed"}
         """
         
-        # Clean up temp file
-        os.unlink(temp_path)
-        
         return combined_content.strip()
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing video: {str(e)}")
 
-async def download_youtube_content(url: str) -> str:
-    """Download and extract content from YouTube video"""
+CAPTION_FORMATS = ["json3", "vtt"]  # preferred caption formats, in order
+
+def select_caption_track(info: Dict, languages: List[str]) -> Optional[Dict]:
+    """Pick a caption track from yt-dlp info: uploaded subtitles before auto-captions,
+    preferred languages (matching regional variants such as en-US) before format."""
+    for source in ("subtitles", "automatic_captions"):
+        tracks = info.get(source) or {}
+        for lang in languages:
+            candidates = [code for code in tracks if code == lang or code.startswith(f"{lang}-")]
+            for code in sorted(candidates, key=lambda code: code != lang):
+                for ext in CAPTION_FORMATS:
+                    for track in tracks[code]:
+                        if track.get("ext") == ext and track.get("url"):
+                            return {**track, "language": code, "automatic": source == "automatic_captions"}
+    return None
+
+def parse_caption_track(data: str, ext: str) -> str:
+    """Plain text from a json3 or WebVTT caption file, without timestamps or repeated lines"""
+    lines = []
+    if ext == "json3":
+        for event in json.loads(data).get("events", []):
+            line = "".join(seg.get("utf8", "") for seg in event.get("segs") or []).strip()
+            if line:
+                lines.append(line)
+    else:
+        for line in data.splitlines():
+            line = line.strip()
+            if not line or line == "WEBVTT" or "-->" in line or line.isdigit() \
+                    or line.startswith(("Kind:", "Language:", "NOTE", "STYLE")):
+                continue
+            lines.append(re.sub(r"<[^>]+>", "", line).strip())
+    
+    # Auto-captions repeat each line while it scrolls; keep the first occurrence of a run
+    text_lines = []
+    for line in lines:
+        if line and (not text_lines or text_lines[-1] != line):
+            text_lines.append(line)
+    return " ".join(text_lines)
+
+def fetch_url_text(url: str) -> str:
+    response = requests.get(url, timeout=30)
+    response.raise_for_status()
+    return response.text
+
+def _extract_youtube_info(ydl_factory: Callable[[Dict], Any], url: str, ydl_opts: Dict) -> Dict:
+    with ydl_factory(ydl_opts) as ydl:
+        return ydl.extract_info(url, download=False)
+
+def _download_youtube_media(ydl_factory: Callable[[Dict], Any], info: Dict, ydl_opts: Dict):
+    with ydl_factory(ydl_opts) as ydl:
+        ydl.process_ie_result(info, download=True)
+
+@timed_stage("extract_youtube")
+async def download_youtube_content(url: str, ydl_factory: Callable[[Dict], Any] = None,
+                                   fetch_text: Callable[[str], str] = None) -> str:
+    """Extract content from a YouTube video, downloading as little as possible.
+    
+    In "captions" mode existing subtitles or auto-captions are used and nothing
+    is downloaded. Otherwise only the audio is downloaded ("video" mode: the
+    video) into a per-job directory and transcribed. ydl_factory (options ->
+    YoutubeDL-like context manager) and fetch_text (URL -> text) default to
+    yt-dlp and HTTP; tests can pass stand-ins that serve local fixture files.
+    Blocking yt-dlp calls run in a thread.
+    """
+    ydl_factory = ydl_factory or (lambda opts: yt_dlp.YoutubeDL(opts))
+    fetch_text = fetch_text or fetch_url_text
+    job_dir = os.path.join(UPLOAD_DIR, f"youtube-{current_job_id.get() or uuid.uuid4()}")
     try:
-        # Configure yt-dlp options
-        ydl_opts = {
-            'format': 'best[height<=720]',  # Limit quality to manage file size
-            'extractaudio': True,
-            'audioformat': 'mp3',
-            'outtmpl': '/tmp/%(title)s.%(ext)s',
-            'quiet': True,
-        }
+        info = await asyncio.to_thread(_extract_youtube_info, ydl_factory, url, {"quiet": True, "skip_download": True})
+        title = info.get('title', 'Unknown')
+        description = info.get('description') or ''
+        duration = int(info.get('duration') or 0)
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            # Get video info
-            info = ydl.extract_info(url, download=False)
-            title = info.get('title', 'Unknown')
-            description = info.get('description', '')
-            duration = info.get('duration', 0)
-            
-            # Check duration (limit to 30 minutes for processing)
-            if duration > 1800:
-                raise HTTPException(
-                    status_code=400, 
-                    detail="Video too long. Please use videos under 30 minutes."
-                )
-            
-            # Download video
-            ydl.download([url])
-            
-            # Find downloaded file
-            video_path = None
-            for file in os.listdir('/tmp'):
-                if file.startswith(title[:20]) and file.endswith(('.mp4', '.webm', '.mkv')):
-                    video_path = f'/tmp/{file}'
-                    break
-            
-            if not video_path:
-                raise Exception("Downloaded video not found")
-            
-            # Extract content from downloaded video
-            with open(video_path, 'rb') as f:
-                video_data = f.read()
+        if duration > YOUTUBE_MAX_DURATION_SECONDS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Video too long. Please use videos under {YOUTUBE_MAX_DURATION_SECONDS // 60} minutes."
+            )
+        
+        content = None
+        track = select_caption_track(info, YOUTUBE_CAPTION_LANGUAGES) if YOUTUBE_INGEST_MODE == "captions" else None
+        if track:
+            try:
+                captions = parse_caption_track(await asyncio.to_thread(fetch_text, track["url"]), track["ext"])
+                if captions.strip():
+                    kind = "Auto-generated captions" if track["automatic"] else "Captions"
+                    content = f"{kind} ({track['language']}):\n{captions}"
+            except Exception as e:
+                print(f"Caption download failed, falling back to audio: {e}")
+        
+        if content is None:
+            video_mode = YOUTUBE_INGEST_MODE == "video"
+            os.makedirs(job_dir, exist_ok=True)
+            await asyncio.to_thread(_download_youtube_media, ydl_factory, info, {
+                'format': 'best[height<=720]' if video_mode else 'bestaudio/best',
+                'outtmpl': os.path.join(job_dir, 'media.%(ext)s'),
+                'quiet': True,
+            })
             
-            content = await extract_text_from_video(video_data, video_path)
+            downloads = [name for name in os.listdir(job_dir) if name.startswith('media.') and not name.endswith('.part')]
+            if not downloads:
+                raise Exception("Downloaded media not found")
+            media_path = os.path.join(job_dir, downloads[0])
             
-            # Add metadata
-            content = f"""
+            if video_mode:
+                content = await extract_text_from_video(media_path)
+            else:
+                content = f"Audio Transcript:\n{await extract_text_from_audio(media_path)}"
+        
+        # Add metadata
+        content = f"""
             Video Title: {title}
             Duration: {duration // 60}:{duration % 60:02d}
             
@@ -440,65 +2712,187 @@ async def download_youtube_content(url: str) -> str:
             
             {content}
             """
-            
-            # Clean up downloaded file
-            os.unlink(video_path)
-            
-            return content.strip()
+        
+        return content.strip()
     
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error processing YouTube video: {str(e)}")
+    finally:
+        await asyncio.to_thread(shutil.rmtree, job_dir, True)
 
 # Keep existing functions for document processing
-def extract_text_from_pdf(file_content: bytes) -> str:
-    """Extract text from PDF file with better handling"""
+def pdf_page_order(page_count: int, mode: str) -> List[int]:
+    """Order in which pages are read; with "even", every prefix is spread across the document"""
+    if mode != "even":
+        return list(range(page_count))
+    order = []
+    seen = set()
+    resolution = 1
+    while len(order) < page_count:
+        for i in range(resolution):
+            page_num = i * page_count // resolution
+            if page_num not in seen:
+                seen.add(page_num)
+                order.append(page_num)
+        resolution *= 2
+    return order
+
+@timed_stage("extract_pdf")
+async def extract_text_from_pdf(file_path: str) -> str:
+    """Extract text from a PDF, reading page batches in parallel worker processes.
+    
+    Batches of PDF_PAGES_PER_TASK pages are spread over the document pool.
+    No new batches are started once PDF_TEXT_BUDGET_TOKENS of text has been
+    extracted. Per-page timings and a summary of the read are sent as job
+    progress events.
+    """
     try:
-        pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-        text = ""
-        for page_num, page in enumerate(pdf_reader.pages):
-            try:
-                page_text = page.extract_text()
-                if page_text.strip():
-                    text += f"\n--- Page {page_num + 1} ---\n"
-                    text += page_text + "\n"
-            except Exception as e:
-                print(f"Error extracting page {page_num + 1}: {e}")
-                continue
+        page_count = await cpu_pools.run("document", _count_pdf_pages_in_worker, file_path)
+        order = pdf_page_order(page_count, PDF_PAGE_ORDER)
+        batches = [order[i:i + PDF_PAGES_PER_TASK] for i in range(0, len(order), PDF_PAGES_PER_TASK)]
+        parallelism = max(1, CPU_WORKERS_PER_TASK.get("document", 1))
+        
+        pages: Dict[int, str] = {}
+        timings: List[tuple] = []
+        tokens = 0
+        started = time.monotonic()
+        in_flight = set()
+        next_batch = 0
+        try:
+            while True:
+                while (next_batch < len(batches) and len(in_flight) < parallelism
+                       and not (PDF_TEXT_BUDGET_TOKENS and tokens >= PDF_TEXT_BUDGET_TOKENS)):
+                    in_flight.add(asyncio.ensure_future(
+                        cpu_pools.run("document", _extract_pdf_pages_in_worker, file_path, batches[next_batch])
+                    ))
+                    next_batch += 1
+                if not in_flight:
+                    break
+                
+                done, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+                batch_timings = []
+                for task in done:
+                    for page_num, page_text, seconds in task.result():
+                        timings.append((page_num, seconds))
+                        batch_timings.append({"page": page_num + 1, "seconds": round(seconds, 4),
+                                              "characters": len(page_text)})
+                        if page_text.strip():
+                            pages[page_num] = page_text
+                            tokens += estimate_text_tokens(page_text)
+                await report_extraction_progress("reading_pdf", len(timings) / max(1, page_count), pages=batch_timings)
+        finally:
+            for task in in_flight:
+                task.cancel()
+        
+        if not pages:
+            raise ValueError("No readable text found in PDF")
         
-        if not text.strip():
-            raise HTTPException(status_code=400, detail="No readable text found in PDF")
+        slowest_page, slowest_seconds = max(timings, key=lambda timing: timing[1])
+        await report_extraction_progress(
+            "read_pdf", 1.0, pages_read=len(timings), page_count=page_count,
+            seconds=round(time.monotonic() - started, 2),
+            cpu_seconds=round(sum(seconds for _, seconds in timings), 2),
+            slowest_page=slowest_page + 1, slowest_seconds=round(slowest_seconds, 2), tokens=tokens
+        )
         
-        return text.strip()
+        return "\n".join(f"--- Page {page_num + 1} ---\n{pages[page_num]}" for page_num in sorted(pages)).strip()
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error reading PDF: {str(e)}")
 
-def extract_text_from_docx(file_content: bytes) -> str:
+@timed_stage("extract_docx")
+async def extract_text_from_docx(file_path: str) -> str:
     """Extract text from DOCX file with better formatting"""
     try:
-        doc = Document(io.BytesIO(file_content))
-        text_parts = []
-        
-        for paragraph in doc.paragraphs:
-            if paragraph.text.strip():
-                text_parts.append(paragraph.text.strip())
-        
-        for table in doc.tables:
-            for row in table.rows:
-                row_text = []
-                for cell in row.cells:
-                    if cell.text.strip():
-                        row_text.append(cell.text.strip())
-                if row_text:
-                    text_parts.append(" | ".join(row_text))
-        
-        if not text_parts:
-            raise HTTPException(status_code=400, detail="No readable text found in DOCX")
-        
-        return "\n\n".join(text_parts)
+        return await cpu_pools.run("document", _extract_docx_in_worker, file_path)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error reading DOCX: {str(e)}")
 
-# Keep existing content generation functions (generate_summary_and_takeaways, generate_mcqs, etc.)
+# Boundaries tried when splitting long text, coarsest first: PDF page markers,
+# blank lines between sections/paragraphs, sentence ends, then any whitespace
+CHUNK_BOUNDARIES = [
+    (r"\n(?=--- Page \d+ ---\n)", "\n"),
+    (r"\n\s*\n", "\n\n"),
+    (r"(?<=[.!?])\s+", " "),
+    (r"\s+", " "),
+]
+
+def split_text_into_chunks(text: str, max_tokens: int, level: int = 0) -> List[str]:
+    """Split text into chunks of at most max_tokens, breaking at the coarsest boundary possible"""
+    if estimate_text_tokens(text) <= max_tokens:
+        return [text] if text.strip() else []
+    if level == len(CHUNK_BOUNDARIES):
+        size = max_tokens * CHARS_PER_TOKEN
+        return [text[i:i + size] for i in range(0, len(text), size)]
+    
+    pattern, separator = CHUNK_BOUNDARIES[level]
+    chunks = []
+    current = ""
+    for part in re.split(pattern, text):
+        for piece in split_text_into_chunks(part, max_tokens, level + 1):
+            candidate = f"{current}{separator}{piece}" if current else piece
+            if estimate_text_tokens(candidate) <= max_tokens:
+                current = candidate
+            else:
+                chunks.append(current)
+                current = piece
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def condense_chunk(chunk: str, title: str, part: int, total: int, budget_tokens: int,
+                         merge: bool = False) -> str:
+    """Summarize one chunk of a long document into dense study notes of about budget_tokens"""
+    if estimate_text_tokens(chunk) <= budget_tokens:
+        return chunk
+    material = "notes from consecutive sections" if merge else f"part {part} of {total}"
+    prompt = f"""
+You are preparing study notes from a long educational document.
+
+TITLE: {title}
+
+Below is {material} of the document. Condense it into dense, factual notes of at most {budget_tokens * 3 // 4} words.
+Keep every key concept, definition, formula, date, name and example that a quiz could ask about.
+Keep page references such as "Page 12" where they appear. Do not add information that is not in the text.
+Reply with the notes only, as plain text bullet points.
+
+TEXT:
+{chunk}
+"""
+    
+    try:
+        notes = await rate_limiter.make_request(prompt, model, prompt_kind="condense")
+        return notes.strip()
+    except Exception as e:
+        record_fallback("condense")
+        print(f"Warning: condensing part {part}/{total} failed, keeping its opening text: {e}")
+        return chunk[:budget_tokens * CHARS_PER_TOKEN]
+
+@timed_stage("condense")
+async def condense_text(text: str, title: str) -> str:
+    """Map-reduce long text down to GENERATION_INPUT_TOKENS.
+    
+    Chunks are condensed concurrently (the rate limiter bounds the actual
+    request rate), each into its share of GENERATION_INPUT_TOKENS, so a document
+    just over the limit loses little. Notes are merged in groups, level by level,
+    until they fit. Text that already fits is returned unchanged.
+    """
+    level = 0
+    while estimate_text_tokens(text) > GENERATION_INPUT_TOKENS:
+        if level == CONDENSE_MAX_LEVELS:
+            record_fallback("condense")
+            return text[:GENERATION_INPUT_TOKENS * CHARS_PER_TOKEN]
+        chunks = split_text_into_chunks(text, CONDENSE_CHUNK_TOKENS)
+        budget_tokens = max(CONDENSE_NOTES_TOKENS, GENERATION_INPUT_TOKENS // len(chunks))
+        notes = await asyncio.gather(*[
+            condense_chunk(chunk, title, part, len(chunks), budget_tokens, merge=level > 0)
+            for part, chunk in enumerate(chunks, start=1)
+        ])
+        text = "\n\n".join(notes)
+        level += 1
+    return text
+
+# Generation functions expect text already condensed to GENERATION_INPUT_TOKENS (see condense_text)
+@timed_stage("generate_summary")
 async def generate_summary_and_takeaways(text: str, title: str) -> Dict:
     """Generate summary and key takeaways using Gemini"""
     prompt = f"""
@@ -506,7 +2900,7 @@ You are an expert instructional designer. Create educational content from this m
 
 TITLE: {title}
 
-CONTENT: {text[:12000]}
+CONTENT: {text}
 
 Generate a JSON response with this exact structure:
 {{
@@ -519,24 +2913,22 @@ Generate the summary in different paragraphs and bullets, etc.
 """
     
     try:
-        response_text = await rate_limiter.make_request(prompt, model)
-        content = response_text.strip()
-        content = re.sub(r'```json\n?', '', content)
-        content = re.sub(r'```\n?', '', content)
-        return json.loads(content)
+        return await rate_limiter.make_request(prompt, model, prompt_kind="summary", parse=parse_json_response)
     except Exception as e:
+        record_fallback("summary")
         return {
             "summary": f"Summary generation failed: {str(e)}",
             "takeaways": ["Error in processing", "Please try again", "Check input format", "Ensure content quality", "Contact support if needed"]
         }
 
+@timed_stage("generate_mcqs")
 async def generate_mcqs(text: str, title: str) -> List[Dict]:
     """Generate MCQs using Gemini"""
     prompt = f"""
 You are an expert quiz creator. Create 10 high-quality multiple-choice questions from this educational content.
 
 TITLE: {title}
-CONTENT: {text[:12000]}
+CONTENT: {text}
 
 Generate a JSON array with this exact structure:
 [
@@ -559,12 +2951,9 @@ Rules:
 """
     
     try:
-        response_text = await rate_limiter.make_request(prompt, model)
-        content = response_text.strip()
-        content = re.sub(r'```json\n?', '', content)
-        content = re.sub(r'```\n?', '', content)
-        return json.loads(content)
+        return await rate_limiter.make_request(prompt, model, prompt_kind="mcqs", parse=parse_json_response)
     except Exception as e:
+        record_fallback("mcqs")
         return [{
             "question": f"Question generation failed: {str(e)}",
             "options": ["A) Error", "B) Please try again", "C) Check content", "D) Contact support"],
@@ -573,13 +2962,14 @@ Rules:
             "bloom_level": "Remember"
         }]
 
+@timed_stage("generate_flashcards")
 async def generate_flashcards(text: str, title: str) -> List[Dict]:
     """Generate flashcards using Gemini"""
     prompt = f"""
 Create 6 flashcards for spaced repetition study from this educational content.
 
 TITLE: {title}
-CONTENT: {text[:12000]}
+CONTENT: {text}
 
 Generate a JSON array with this exact structure:
 [
@@ -598,212 +2988,1208 @@ Rules:
 """
     
     try:
-        response_text = await rate_limiter.make_request(prompt, model)
-        content = response_text.strip()
-        content = re.sub(r'```json\n?', '', content)
-        content = re.sub(r'```\n?', '', content)
-        return json.loads(content)
+        return await rate_limiter.make_request(prompt, model, prompt_kind="flashcards", parse=parse_json_response)
     except Exception as e:
+        record_fallback("flashcards")
         return [{
             "front": f"Flashcard generation failed: {str(e)}",
             "back": "Please try again with different content"
         }]
 
-async def localize_content(content: Dict, target_language: str) -> Dict:
-    """Translate content to target language"""
-    lang_names = {"hi": "Hindi", "es": "Spanish", "fr": "French"}
-    lang_name = lang_names.get(target_language, target_language)
+# Response schema for combined generation, one entry per section. Written out by hand
+# because Gemini's schema subset does not accept the $ref/$defs that Pydantic emits.
+COMBINED_SECTION_SCHEMAS = {
+    "summary": {
+        "summary": {"type": "string"},
+        "takeaways": {"type": "array", "items": {"type": "string"}},
+    },
+    "mcqs": {
+        "mcqs": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {
+                    "question": {"type": "string"},
+                    "options": {"type": "array", "items": {"type": "string"}},
+                    "correct_answer": {"type": "string"},
+                    "explanation": {"type": "string"},
+                    "bloom_level": {"type": "string"},
+                },
+                "required": ["question", "options", "correct_answer", "explanation", "bloom_level"],
+            },
+        },
+    },
+    "flashcards": {
+        "flashcards": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"front": {"type": "string"}, "back": {"type": "string"}},
+                "required": ["front", "back"],
+            },
+        },
+    },
+}
+
+COMBINED_SECTION_INSTRUCTIONS = {
+    "summary": """- "summary": a 250-300 word summary suitable for undergraduate students, engaging, clear and well-structured in paragraphs and bullets
+- "takeaways": 5 key points, each 10-15 words, covering the main concepts in simple language""",
+    "mcqs": """- "mcqs": 10 multiple-choice questions covering different sections of the content, each with "question",
+  "options" (exactly 4, prefixed "A) " to "D) "), "correct_answer" (the letter), "explanation" (under 25 words)
+  and "bloom_level" (Remember, Understand, Apply, Analyze, Evaluate or Create). One clearly correct answer,
+  plausible distractors, no negative phrasing, and a mix of Bloom levels""",
+    "flashcards": """- "flashcards": 6 flashcards for spaced repetition, each testing one atomic concept, with "front"
+  (question, term or scenario) and "back" (self-contained answer under 30 words)""",
+}
+
+COMBINED_SECTION_MODELS = {"summary": SummaryContent, "mcqs": MCQSet, "flashcards": FlashcardSet}
+
+def combined_generation_config(sections: List[str]) -> Dict:
+    """Gemini JSON-mode config whose schema covers only the requested sections"""
+    properties = {}
+    for section in sections:
+        properties.update(COMBINED_SECTION_SCHEMAS[section])
+    return {
+        "response_mime_type": "application/json",
+        "response_schema": {"type": "object", "properties": properties, "required": list(properties)},
+    }
+
+def validate_combined_section(section: str, data: Any) -> Optional[Any]:
+    """Validated section content in the shape the separate generators return, or None"""
+    try:
+        validated = COMBINED_SECTION_MODELS[section].model_validate(data)
+    except ValidationError:
+        return None
+    if section == "summary":
+        return validated.model_dump()
+    return validated.model_dump()[section]
+
+class IncompleteCombinedReply(ValueError):
+    """A combined reply with invalid sections; carries the parsed reply so valid sections can be kept"""
+    def __init__(self, data: Any, invalid: List[str]):
+        super().__init__(f"invalid sections in reply: {', '.join(invalid)}")
+        self.data = data
+
+def parse_combined_reply(response_text: str, sections: List[str]) -> Dict:
+    """Parse a combined-generation reply, rejecting it (so it is not cached) unless every
+    requested section is valid"""
+    data = parse_json_response(response_text)
+    invalid = [section for section in sections
+               if not isinstance(data, dict) or validate_combined_section(section, data) is None]
+    if invalid:
+        raise IncompleteCombinedReply(data, invalid)
+    return data
+
+@timed_stage("generate_combined")
+async def generate_combined_content(text: str, title: str) -> Dict[str, Any]:
+    """Generate summary, MCQs and flashcards with one schema-constrained Gemini call.
+    
+    The reply is validated section by section; sections that are missing or
+    malformed are requested again on their own, up to COMBINED_GENERATION_ATTEMPTS
+    calls in total. Anything still missing falls back to its separate generator.
+    Only replies with every section valid are stored in the response cache.
+    Returns {"summary": {...}, "mcqs": [...], "flashcards": [...]}.
+    """
+    results: Dict[str, Any] = {}
+    pending = list(COMBINED_SECTION_MODELS)
+    
+    for attempt in range(COMBINED_GENERATION_ATTEMPTS):
+        instructions = "\n".join(COMBINED_SECTION_INSTRUCTIONS[section] for section in pending)
+        prompt = f"""
+You are an expert instructional designer. Create educational content from this material.
+
+TITLE: {title}
+
+CONTENT: {text}
+
+Reply with a single JSON object containing:
+{instructions}
+
+Keep everything factual, concise and scaffolded for learning.
+"""
+        try:
+            # A retry repeats a prompt that already got a bad reply, so it must bypass the response cache
+            data = await rate_limiter.make_request(
+                prompt, model, use_cache=attempt == 0, generation_config=combined_generation_config(pending),
+                prompt_kind="combined", parse=lambda text, sections=pending: parse_combined_reply(text, sections)
+            )
+        except IncompleteCombinedReply as e:
+            data = e.data  # keep the valid sections; the reply was not cached
+        except Exception as e:
+            print(f"Combined generation attempt {attempt + 1} failed: {e}")
+            continue
+        
+        if isinstance(data, dict):
+            for section in pending:
+                content = validate_combined_section(section, data)
+                if content is not None:
+                    results[section] = content
+        pending = [section for section in pending if section not in results]
+        if not pending:
+            return results
+        print(f"Combined generation attempt {attempt + 1} missing sections: {', '.join(pending)}")
     
+    separate_generators = {
+        "summary": generate_summary_and_takeaways,
+        "mcqs": generate_mcqs,
+        "flashcards": generate_flashcards,
+    }
+    fallbacks = await asyncio.gather(*[separate_generators[section](text, title) for section in pending])
+    results.update(zip(pending, fallbacks))
+    return results
+
+async def take_section(generated: Dict[str, Any], section: str) -> Any:
+    """Pipeline stage exposing one section of the combined generation output"""
+    return generated[section]
+
+LANGUAGE_NAMES = {
+    "hi": "Hindi", "es": "Spanish", "fr": "French", "de": "German", "pt": "Portuguese",
+    "bn": "Bengali", "ta": "Tamil", "te": "Telugu", "mr": "Marathi", "ar": "Arabic",
+    "zh": "Chinese", "ja": "Japanese",
+}
+LANGUAGE_CODE_PATTERN = re.compile(r"^[a-z]{2,3}(-[A-Za-z]{2,4})?$")
+
+def parse_language_targets(values: Optional[List[str]]) -> List[str]:
+    """Requested language codes (repeated and/or comma-separated), or the defaults"""
+    languages = []
+    for value in values or []:
+        for lang in value.split(","):
+            lang = lang.strip()
+            if not lang:
+                continue
+            if not LANGUAGE_CODE_PATTERN.match(lang):
+                raise HTTPException(status_code=400, detail=f"Invalid language code: {lang}")
+            if lang not in languages:
+                languages.append(lang)
+    if len(languages) > MAX_LANGUAGE_TARGETS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_LANGUAGE_TARGETS} target languages are supported")
+    return languages or list(DEFAULT_LANGUAGE_TARGETS)
+
+# Text fields of each artifact list that are translated; answer letters and Bloom levels are kept
+LOCALIZED_FIELDS = {"mcqs": ("question", "options", "explanation"), "flashcards": ("front", "back")}
+OPTION_PREFIX = re.compile(r"^\s*[A-Da-d]\)\s*")
+
+def translation_segments(artifacts: Dict) -> List[Tuple[tuple, str]]:
+    """(path, text) for every translatable string; MCQ options without their "A) " prefix"""
+    segments = [(("summary",), artifacts.get("summary"))]
+    segments += [(("takeaways", i), takeaway) for i, takeaway in enumerate(artifacts.get("takeaways") or [])]
+    for section, fields in LOCALIZED_FIELDS.items():
+        for i, item in enumerate(artifacts.get(section) or []):
+            for field in fields:
+                value = item.get(field)
+                if field == "options" and isinstance(value, list):
+                    segments += [((section, i, field, j), OPTION_PREFIX.sub("", option)) for j, option in enumerate(value)]
+                else:
+                    segments.append(((section, i, field), value))
+    return [(path, text) for path, text in segments if isinstance(text, str) and text.strip()]
+
+def apply_translations(artifacts: Dict, translations: Dict[tuple, str]) -> Dict:
+    """Copy of artifacts with translated segments written back in place"""
+    localized = json.loads(json.dumps(artifacts))
+    for path, text in translations.items():
+        target = localized
+        for key in path[:-1]:
+            target = target[key]
+        if path[-2:-1] == ("options",):
+            prefix = OPTION_PREFIX.match(target[path[-1]])
+            text = f"{prefix.group(0) if prefix else ''}{text}"
+        target[path[-1]] = text
+    return localized
+
+async def translate_segments(texts: List[str], target_language: str) -> Dict[int, str]:
+    """Translate many text segments in one Gemini call; returns translations by index"""
+    lang_name = LANGUAGE_NAMES.get(target_language, target_language)
+    segments = [{"id": i, "text": text} for i, text in enumerate(texts)]
     prompt = f"""
-Translate and culturally adapt this educational content to {lang_name} for local learners.
+Translate and culturally adapt these segments of educational content to {lang_name} for local learners.
 
-CONTENT: {json.dumps(content, indent=2)}
+SEGMENTS: {json.dumps(segments, ensure_ascii=False, indent=2)}
 
-Generate the same JSON structure but with all text translated to {lang_name}.
+Reply with a JSON array containing one {{"id": ..., "text": ...}} object per segment, with the same ids
+and each text translated to {lang_name}.
 
 Rules:
 - Keep technical terms accurate
-- Adapt cultural references appropriately  
+- Adapt cultural references appropriately
 - Maintain academic tone
-- Keep same JSON structure
 - Simplify complex idioms
 - Ensure translations are natural for learners
 """
-    
-    try:
-        response_text = await rate_limiter.make_request(prompt, model)
-        content_text = response_text.strip()
-        content_text = re.sub(r'```json\n?', '', content_text)
-        content_text = re.sub(r'```\n?', '', content_text)
-        return json.loads(content_text)
-    except Exception as e:
-        return {**content, "translation_error": f"Translation failed: {str(e)}"}
+    entries = await rate_limiter.make_request(prompt, model, prompt_kind="translate", parse=parse_json_response, generation_config={
+        "response_mime_type": "application/json",
+        "response_schema": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "properties": {"id": {"type": "integer"}, "text": {"type": "string"}},
+                "required": ["id", "text"],
+            },
+        },
+    })
+    translations = {}
+    for entry in entries:
+        if isinstance(entry, dict) and isinstance(entry.get("id"), int) and isinstance(entry.get("text"), str) \
+                and 0 <= entry["id"] < len(texts) and entry["text"].strip():
+            translations[entry["id"]] = entry["text"]
+    return translations
+
+# Shown in place of a translation when localization fails
+LOCALIZATION_PLACEHOLDERS = {
+    "hi": {"summary": "हिंदी अनुवाद सेवा अस्थायी रूप से सीमित है।", "takeaways": ["अनुवाद सेवा सीमित"]},
+    "es": {"summary": "Servicio de traducción temporalmente limitado.", "takeaways": ["Servicio limitado"]},
+}
 
-def create_google_forms_csv(mcqs: List[Dict]) -> str:
-    """Create CSV format for Google Forms import"""
-    output = StringIO()
-    writer = csv.writer(output)
+@timed_stage("localize")
+async def localize_artifacts(artifacts: Dict, target_language: str) -> Dict:
+    """Translate summary, takeaways, MCQs and flashcards with one batched Gemini call.
+    
+    Translations are cached per source segment and language, so segments translated
+    before (for any job) are reused and only the rest are sent, each distinct text
+    once; the lookups and the new entries each go through the cache in one batch.
+    Segments that could not be translated stay in the source language and are counted in "translation_error";
+    if nothing could be translated the summary shows a placeholder instead.
+    """
+    segments = translation_segments(artifacts)
+    texts = list(dict.fromkeys(text for _, text in segments))
+    keys = {text: content_hash("translation", model.model_name, target_language, text) for text in texts}
+    cached = await translation_cache.get_many(list(keys.values()))
+    by_text = {text: value for text, value in zip(texts, cached) if value is not None}
     
-    writer.writerow(["Question", "Option 1", "Option 2", "Option 3", "Option 4", "Correct Answer", "Explanation"])
+    missing = [text for text in texts if text not in by_text]
+    error = None
+    if missing:
+        try:
+            translated = await translate_segments(missing, target_language)
+        except Exception as e:
+            translated = {}
+            error = str(e)
+        for i, translation in translated.items():
+            by_text[missing[i]] = translation
+        await translation_cache.set_many({keys[missing[i]]: translation for i, translation in translated.items()})
     
+    translations = {path: by_text[text] for path, text in segments if text in by_text}
+    localized = apply_translations(artifacts, translations)
+    untranslated = len(segments) - len(translations)
+    if untranslated:
+        localized["translation_error"] = f"Translation failed for {untranslated} of {len(segments)} segments" + (
+            f": {error}" if error else ""
+        )
+        if not translations:
+            localized.update(LOCALIZATION_PLACEHOLDERS.get(
+                target_language,
+                {"summary": "Translation service temporarily limited.", "takeaways": ["Service limited"]}
+            ))
+    return localized
+
+GOOGLE_FORMS_CSV_HEADER = ["Question", "Option 1", "Option 2", "Option 3", "Option 4", "Correct Answer", "Explanation"]
+
+def google_forms_csv_rows(mcqs: List[Dict]) -> Iterator[List[str]]:
+    """Rows for Google Forms import, header first; MCQs without four options are skipped"""
+    yield GOOGLE_FORMS_CSV_HEADER
     for mcq in mcqs:
         if "options" in mcq and len(mcq["options"]) >= 4:
             options_text = [opt[3:] if len(opt) > 3 else opt for opt in mcq["options"]]
-            writer.writerow([
+            yield [
                 mcq["question"],
                 options_text[0],
-                options_text[1], 
+                options_text[1],
                 options_text[2],
                 options_text[3],
                 mcq["correct_answer"],
                 mcq["explanation"]
-            ])
-    
-    return output.getvalue()
+            ]
+
+def dumps_json(value: Any, indent: bool = False) -> bytes:
+    """UTF-8 JSON, via orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_INDENT_2 if indent else 0)
+    return json.dumps(value, indent=2 if indent else None, ensure_ascii=False).encode("utf-8")
 
-@app.post("/repurpose")
-async def create_repurpose_job(
-    file: Optional[UploadFile] = File(None),
-    title: str = Form("Educational Content"),
-    content_type: str = Form("file"),
-    youtube_url: Optional[str] = Form(None)
-):
-    """Enhanced content repurposing endpoint supporting multiple file types and YouTube"""
-    
-    # Validate input
-    if content_type == "youtube":
-        if not youtube_url or not validate_youtube_url(youtube_url):
-            raise HTTPException(status_code=400, detail="Valid YouTube URL required")
+def render_json_export(content: Dict) -> Iterator[bytes]:
+    data = dumps_json(content, indent=True)
+    for start in range(0, len(data), EXPORT_CHUNK_SIZE):
+        yield data[start:start + EXPORT_CHUNK_SIZE]
+
+def render_csv_export(content: Dict) -> Iterator[bytes]:
+    """Google Forms CSV of the MCQs"""
+    buffer = StringIO()
+    writer = csv.writer(buffer)
+    for row in google_forms_csv_rows(content.get("mcqs", [])):
+        writer.writerow(row)
+        if buffer.tell() >= EXPORT_CHUNK_SIZE:
+            yield buffer.getvalue().encode("utf-8")
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue().encode("utf-8")
+
+def render_jsonl_export(content: Dict) -> Iterator[bytes]:
+    """One record per line: the summary, then each MCQ and flashcard"""
+    yield dumps_json({"type": "summary", "summary": content.get("summary", ""),
+                      "takeaways": content.get("takeaways", [])}) + b"\n"
+    for mcq in content.get("mcqs", []):
+        yield dumps_json({"type": "mcq", **mcq}) + b"\n"
+    for flashcard in content.get("flashcards", []):
+        yield dumps_json({"type": "flashcard", **flashcard}) + b"\n"
+
+# format -> (media type, renderer, file extension)
+EXPORT_FORMATS = {
+    "json": ("application/json", render_json_export, "json"),
+    "csv": ("text/csv; charset=utf-8", render_csv_export, "csv"),
+    "jsonl": ("application/x-ndjson", render_jsonl_export, "jsonl"),
+}
+
+# Rendered exports by (job, format, language); results never change once a job completes
+export_cache = MemoryLRUCache(EXPORT_CACHE_MAX_ENTRIES)
+
+def export_links(job_id: str) -> Dict[str, str]:
+    return {export_format: f"/outputs/{job_id}/export/{export_format}" for export_format in EXPORT_FORMATS}
+
+async def extract_content(payload: Dict) -> str:
+    """Extract text from a queued upload or YouTube URL"""
+    if payload["content_type"] == "youtube":
+        return await download_youtube_content(payload["youtube_url"])
+    
+    file_path = payload["file_path"]
+    filename = payload["filename"]
+    file_type = get_file_type(filename)
+    
+    if file_type == "document":
+        if filename.lower().endswith('.pdf'):
+            return await extract_text_from_pdf(file_path)
+        elif filename.lower().endswith('.docx'):
+            return await extract_text_from_docx(file_path)
+        else:  # .txt
+            return (await asyncio.to_thread(read_file_bytes, file_path)).decode('utf-8')
+    elif file_type == "image":
+        return await extract_text_from_image(file_path)
+    elif file_type == "audio":
+        return await extract_text_from_audio(file_path)
+    elif file_type == "video":
+        return await extract_text_from_video(file_path)
     else:
-        if not file:
-            raise HTTPException(status_code=400, detail="File required when content_type is 'file'")
-        validate_file(file)
+        raise HTTPException(status_code=400, detail="Unsupported file type")
+
+class StageExecutor:
+    """Dependency-aware runner for async pipeline stages.
     
-    # Generate job ID
-    job_id = str(uuid.uuid4())
+    Every stage starts as soon as the stages it depends on have finished, so
+    independent stages run concurrently. Stages receive their dependencies'
+    results as positional arguments, in the order the dependencies were listed.
+    Gemini calls made by the stages still go through the shared rate limiter.
+    """
+    def __init__(self, on_stage_done: Optional[Callable[[str, int, int], Awaitable]] = None):
+        self.stages: Dict[str, tuple] = {}
+        self.on_stage_done = on_stage_done
     
-    # Initialize job status
-    jobs_storage[job_id] = {
+    def add(self, name: str, func: Callable[..., Awaitable], depends_on: List[str] = ()):
+        """Register a stage; dependencies must already be registered"""
+        if name in self.stages:
+            raise ValueError(f"Stage '{name}' is already registered")
+        missing = [dep for dep in depends_on if dep not in self.stages]
+        if missing:
+            raise ValueError(f"Stage '{name}' depends on unknown stages: {', '.join(missing)}")
+        self.stages[name] = (func, list(depends_on))
+    
+    async def run(self) -> Dict[str, Any]:
+        """Run all stages and return their results by name"""
+        tasks: Dict[str, asyncio.Task] = {}
+        completed = 0
+        
+        async def run_stage(name: str):
+            nonlocal completed
+            func, depends_on = self.stages[name]
+            inputs = [await tasks[dep] for dep in depends_on]
+            with trace_span(f"pipeline.{name}"):
+                output = await func(*inputs)
+            completed += 1
+            if self.on_stage_done:
+                await self.on_stage_done(name, completed, len(self.stages))
+            return output
+        
+        for name in self.stages:
+            tasks[name] = asyncio.create_task(run_stage(name))
+        
+        try:
+            await asyncio.gather(*tasks.values())
+        except BaseException:
+            for task in tasks.values():
+                task.cancel()
+            await asyncio.gather(*tasks.values(), return_exceptions=True)
+            raise
+        
+        return {name: task.result() for name, task in tasks.items()}
+
+async def publish_job_finished(job_id: str, job_status: str, **details):
+    """Final event for a job; clients fetch the result itself from /outputs/{job_id}"""
+    await job_store.publish(job_id, {
+        "event": job_status,
         "job_id": job_id,
-        "status": "processing",
-        "progress": 0,
-        "result": None,
-        "error": None
-    }
+        "status": job_status,
+        "progress": 100 if job_status == "completed" else 0,
+        **({"outputs_url": f"/outputs/{job_id}"} if job_status == "completed" else {}),
+        **details
+    })
+
+async def fail_job(job_id: str, error: Exception, payload: Optional[Dict] = None):
+    JOBS_FINISHED.inc(status="failed")
+    message = error.detail if isinstance(error, HTTPException) else str(error)
+    await job_store.update(
+        job_id,
+        status="failed",
+        stage="failed",
+        progress=0,
+        error=message
+    )
+    if payload:
+        await finish_job_trace(job_id, payload)
+    await publish_job_finished(job_id, "failed", error=message)
+
+async def finish_job_trace(job_id: str, payload: Dict):
+    """Stop the job's profiler and save its trace once the job has completed or failed"""
+    profiler = payload.get("profiler")
+    if profiler:
+        profiler.stop()
+    active_traces.pop(job_id, None)
+    await save_job_trace(job_id, payload["trace"], profiler)
+
+def enter_job_context(job_id: str, payload: Dict):
+    """Make the job's id, trace and profiler current for the running task and its subtasks"""
+    current_job_id.set(job_id)
+    current_trace.set(payload["trace"])
+    current_span_id.set(None)
+    current_profiler.set(payload.get("profiler"))
+    current_fallbacks.set([])
+
+def leave_job_context():
+    """Detach the worker task from the job it just processed before it picks up the next one"""
+    profiler = current_profiler.get()
+    if profiler:
+        profiler.untrack_current_task()
+    current_job_id.set(None)
+    current_trace.set(None)
+    current_profiler.set(None)
+    current_fallbacks.set(None)
+
+def youtube_extraction_key(url: str) -> str:
+    """Extraction cache key for a video; the ingest settings decide which text comes out"""
+    return content_hash(CACHE_VERSION, "youtube", url, YOUTUBE_INGEST_MODE, ",".join(YOUTUBE_CAPTION_LANGUAGES))
+
+async def extract_job_content(job_id: str, payload: Dict) -> Optional[Dict]:
+    """Extraction step of a queued job, run by the worker for its content type.
+    
+    Returns the payload for the generation step, or None when the job failed.
+    """
+    title = payload["title"]
+    content_type = payload["content_type"]
+    
+    trace = payload.setdefault("trace", JobTrace(job_id, payload.get("queued_at")))
+    active_traces[job_id] = trace
+    trace.add_span("queue.extraction", trace.started, time.time(), queue=payload.get("queue_kind"))
+    if payload.get("profile"):
+        payload["profiler"] = JobProfiler()
+        payload["profiler"].start()
+    enter_job_context(job_id, payload)
+    await update_job_progress(job_id, "stage", stage="extracting", progress=10)
     
     try:
-        # Extract content based on type
+        # Extract content based on type, reusing earlier extractions of identical input
+        file_hash = None
         if content_type == "youtube":
-            jobs_storage[job_id]["progress"] = 10
-            text = await download_youtube_content(youtube_url)
+            extraction_key = youtube_extraction_key(payload["youtube_url"])
             content_source = "YouTube"
         else:
-            file_content = await file.read()
-            file_type = get_file_type(file.filename)
-            
-            jobs_storage[job_id]["progress"] = 10
-            
-            if file_type == "document":
-                if file.filename.lower().endswith('.pdf'):
-                    text = extract_text_from_pdf(file_content)
-                elif file.filename.lower().endswith('.docx'):
-                    text = extract_text_from_docx(file_content)
-                else:  # .txt
-                    text = file_content.decode('utf-8')
-            elif file_type == "image":
-                text = await extract_text_from_image(file_content)
-            elif file_type == "audio":
-                text = await extract_text_from_audio(file_content, file.filename)
-            elif file_type == "video":
-                text = await extract_text_from_video(file_content, file.filename)
-            else:
-                raise HTTPException(status_code=400, detail="Unsupported file type")
-            
+            filename = payload["filename"]
+            file_type = get_file_type(filename)
+            file_hash = payload["file_hash"]
+            extraction_key = content_hash(CACHE_VERSION, file_hash, os.path.splitext(filename)[1].lower())
             content_source = file_type.title()
         
-        jobs_storage[job_id]["progress"] = 30
-        
-        # Generate educational content
-        summary_data = await generate_summary_and_takeaways(text, title)
-        jobs_storage[job_id]["progress"] = 50
-        
-        mcqs = await generate_mcqs(text, title)
-        jobs_storage[job_id]["progress"] = 70
+        with trace_span("extract", content_source=content_source) as span:
+            text = await extraction_cache.get(extraction_key)
+            extraction_cached = text is not None
+            if text is None:
+                text = await extract_content(payload)
+                if is_cacheable():
+                    await extraction_cache.set(extraction_key, text)
+            span.update(cache_hit=extraction_cached, characters=len(text))
+        await update_job_progress(
+            job_id, "extracted", stage="extracted", progress=30, characters=len(text), cache_hit=extraction_cached
+        )
         
-        flashcards = await generate_flashcards(text, title)
-        jobs_storage[job_id]["progress"] = 85
+        # Reuse the generated result when the same text and options were processed before; it
+        # is still localized by the generation step (from the translation cache where possible)
+        result_key = content_hash(CACHE_VERSION, text, title, "combined" if COMBINED_GENERATION else "separate")
+        cached_result = await result_cache.get(result_key)
         
-        # Create result
-        result = {
+        return {
             "title": title,
             "content_source": content_source,
-            "summary": summary_data.get("summary", ""),
-            "takeaways": summary_data.get("takeaways", []),
-            "mcqs": mcqs,
-            "flashcards": flashcards,
-            "localized": {},
-            "exports": {},
+            "file_hash": file_hash,
+            "text": text,
+            "result_key": result_key,
+            "cached_result": cached_result,
+            "language_targets": payload.get("language_targets") or list(DEFAULT_LANGUAGE_TARGETS),
+            "queued_at": payload.get("queued_at"),
+            "trace": trace,
+            "profiler": payload.get("profiler"),
+            "extracted_at": time.time(),
         }
+    
+    except Exception as e:
+        await fail_job(job_id, e, payload)
+        return None
+    finally:
+        leave_job_context()
+        remove_file(payload.get("file_path"))
+
+async def generate_job_content(job_id: str, payload: Dict):
+    """Generation step of a job whose content has been extracted"""
+    title = payload["title"]
+    file_hash = payload["file_hash"]
+    text = payload["text"]
+    result_key = payload["result_key"]
+    base_result = payload["cached_result"]
+    languages = payload["language_targets"]
+    
+    payload["trace"].add_span("queue.generation", payload["extracted_at"], time.time())
+    enter_job_context(job_id, payload)
+    await update_job_progress(job_id, "stage", stage="generating", progress=30)
+    
+    try:
+        # Generate educational content. Summary, MCQs and flashcards are independent;
+        # once all three are ready, every requested language is translated concurrently,
+        # one batched request per language.
+        async def on_stage_done(name: str, completed: int, total: int):
+            await update_job_progress(
+                job_id, "stage_completed", progress=30 + int(65 * completed / total),
+                name=name, completed=completed, total=total
+            )
         
-        # Generate localizations (simplified for demo due to rate limits)
-        try:
-            for lang in ["hi", "es"]:
-                localized = await localize_content({
-                    "summary": result["summary"],
-                    "takeaways": result["takeaways"][:2],  # Limit to reduce API calls
-                }, lang)
-                result["localized"][lang] = {
-                    **localized,
-                    "mcqs": result["mcqs"],
-                    "flashcards": result["flashcards"]
+        pipeline = StageExecutor(on_stage_done=on_stage_done)
+        if base_result is None:
+            pipeline.add("condensed", lambda: condense_text(text, title))
+            if COMBINED_GENERATION:
+                pipeline.add("generated", lambda condensed: generate_combined_content(condensed, title), depends_on=["condensed"])
+                for section in ["summary", "mcqs", "flashcards"]:
+                    pipeline.add(
+                        section,
+                        lambda generated, section=section: take_section(generated, section),
+                        depends_on=["generated"]
+                    )
+            else:
+                pipeline.add("summary", lambda condensed: generate_summary_and_takeaways(condensed, title), depends_on=["condensed"])
+                pipeline.add("mcqs", lambda condensed: generate_mcqs(condensed, title), depends_on=["condensed"])
+                pipeline.add("flashcards", lambda condensed: generate_flashcards(condensed, title), depends_on=["condensed"])
+            
+            async def build_base_result(summary_data: Dict, mcqs: List[Dict], flashcards: List[Dict]) -> Dict:
+                base = {
+                    "title": title,
+                    "content_source": payload["content_source"],
+                    "summary": summary_data.get("summary", ""),
+                    "takeaways": summary_data.get("takeaways", []),
+                    "mcqs": mcqs,
+                    "flashcards": flashcards,
                 }
-        except:
-            # Provide placeholder if translation fails
-            result["localized"] = {
-                "hi": {"summary": "हिंदी अनुवाद सेवा अस्थायी रूप से सीमित है।", "takeaways": ["अनुवाद सेवा सीमित"]},
-                "es": {"summary": "Servicio de traducción temporalmente limitado.", "takeaways": ["Servicio limitado"]}
-            }
+                if is_cacheable():
+                    await result_cache.set(result_key, base)
+                return base
+            
+            pipeline.add("base", build_base_result, depends_on=["summary", "mcqs", "flashcards"])
+            base_dependencies = ["base"]
+        else:
+            base_dependencies = []
+        
+        for lang in languages:
+            pipeline.add(
+                f"localized_{lang}",
+                lambda base=base_result, lang=lang: localize_artifacts({
+                    section: base[section] for section in ("summary", "takeaways", "mcqs", "flashcards")
+                }, lang),
+                depends_on=base_dependencies
+            )
+        with trace_span("generate", cached_result=base_result is not None, languages=",".join(languages)):
+            outputs = await pipeline.run()
         
-        # Create exports
-        result["exports"]["google_forms_csv"] = create_google_forms_csv(mcqs)
-        result["exports"]["full_json"] = json.dumps(result, indent=2)
+        base = base_result if base_result is not None else outputs["base"]
+        # Exports are rendered on demand by /outputs/{job_id}/export/{format}
+        result = {
+            **base,
+            "localized": {lang: outputs[f"localized_{lang}"] for lang in languages},
+            "exports": export_links(job_id),
+            "file_hash": file_hash,
+        }
         
         # Complete job
-        jobs_storage[job_id].update({
-            "status": "completed",
-            "progress": 100,
-            "result": result
-        })
+        fields = {"cache_hit": True} if base_result is not None else {}
+        await job_store.update(
+            job_id,
+            status="completed",
+            stage="completed",
+            progress=100,
+            result=result,
+            **fields
+        )
+        await finish_job_trace(job_id, payload)
+        await publish_job_finished(job_id, "completed", **fields)
+        JOBS_FINISHED.inc(status="completed")
+        if payload.get("queued_at"):
+            STAGE_SECONDS.observe(time.time() - payload["queued_at"], stage="job_total")
         
     except Exception as e:
-        jobs_storage[job_id].update({
-            "status": "failed",
-            "progress": 0,
-            "error": str(e)
+        await fail_job(job_id, e, payload)
+    finally:
+        leave_job_context()
+
+class JobQueue:
+    """Background job queue with a fixed pool of async workers per content type.
+    
+    Each content type gets its own queue and workers, so a backlog of videos never
+    holds up documents and the number of heavy jobs running at once stays bounded.
+    Content-type workers only extract; they hand the text to the "generation"
+    queue and move on to the next job, so extraction of one job overlaps the
+    Gemini calls of others.
+    """
+    def __init__(self, workers_per_type: Dict[str, int], max_queued: int = 100):
+        self.workers_per_type = workers_per_type
+        self.max_queued = max_queued
+        self.queues: Dict[str, asyncio.Queue] = {}
+        self.active = {kind: 0 for kind in workers_per_type}
+        self.workers: List[asyncio.Task] = []
+    
+    def start(self):
+        """Create the queues and spawn the workers on the running event loop"""
+        for kind, count in self.workers_per_type.items():
+            self.queues[kind] = asyncio.Queue(maxsize=self.max_queued)
+            for _ in range(max(1, count)):
+                self.workers.append(asyncio.create_task(self._worker(kind)))
+    
+    async def stop(self):
+        """Cancel all workers; queued jobs are dropped"""
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+    
+    def capacity(self, kind: str) -> int:
+        """Jobs of this kind that can still be queued"""
+        return self.max_queued - self.queues[kind].qsize()
+    
+    def enqueue(self, kind: str, job_id: str, payload: Dict):
+        """Queue a job without waiting, rejecting it when the backlog is full"""
+        try:
+            self.queues[kind].put_nowait((job_id, payload))
+        except asyncio.QueueFull:
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail=f"Too many {kind} jobs queued. Please try again later."
+            )
+    
+    async def _worker(self, kind: str):
+        queue = self.queues[kind]
+        while True:
+            job_id, payload = await queue.get()
+            self.active[kind] += 1
+            try:
+                if kind == "generation":
+                    await generate_job_content(job_id, payload)
+                else:
+                    generation_payload = await extract_job_content(job_id, payload)
+                    if generation_payload is not None:
+                        # Waits when the generation backlog is full, throttling extraction
+                        await self.queues["generation"].put((job_id, generation_payload))
+            except Exception as e:
+                print(f"Job {job_id} crashed in {kind} worker: {e}")
+                try:
+                    # Finish the trace too unless the job already did before crashing
+                    await fail_job(job_id, e, payload if job_id in active_traces else None)
+                except Exception as store_error:
+                    print(f"Warning: could not mark job {job_id} failed: {store_error}")
+            finally:
+                self.active[kind] -= 1
+                queue.task_done()
+    
+    def stats(self) -> Dict:
+        return {
+            kind: {
+                "workers": max(1, count),
+                "active": self.active[kind],
+                "queued": self.queues[kind].qsize() if kind in self.queues else 0,
+            }
+            for kind, count in self.workers_per_type.items()
+        }
+
+# Global job queue instance
+job_queue = JobQueue(JOB_WORKERS_PER_TYPE, max_queued=JOB_QUEUE_MAX_SIZE)
+
+def collect_queue_metrics() -> List[Tuple[Dict[str, str], float]]:
+    samples = []
+    for kind, stats in job_queue.stats().items():
+        samples.append(({"queue": kind, "state": "queued"}, stats["queued"]))
+        samples.append(({"queue": kind, "state": "active"}, stats["active"]))
+    samples.append(({"queue": "gemini", "state": "queued"}, rate_limiter.waiting))
+    samples.append(({"queue": "gemini", "state": "active"}, rate_limiter.in_flight))
+    return samples
+
+def named_caches() -> Dict[str, Dict]:
+    caches = {
+        "extraction": extraction_cache.stats(),
+        "result": result_cache.stats(),
+        "translation": translation_cache.stats(),
+    }
+    if llm_response_cache:
+        caches["llm_response"] = llm_response_cache.stats()
+    return caches
+
+metrics.register(CallbackGauge(
+    "contentcube_queue_depth", "Jobs waiting and running per job queue, and Gemini calls waiting and in flight",
+    collect_queue_metrics
+))
+metrics.register(CallbackCounter(
+    "contentcube_cache_lookups_total", "Cache lookups since startup by result",
+    lambda: [({"cache": name, "result": result}, stats[result])
+             for name, stats in named_caches().items() for result in ("hits", "misses") if result in stats]
+))
+metrics.register(CallbackGauge(
+    "contentcube_cache_hit_ratio", "Share of cache lookups served from the cache",
+    lambda: [({"cache": name}, stats["hit_rate"]) for name, stats in named_caches().items()]
+))
+metrics.register(CallbackGauge(
+    "process_resident_memory_bytes", "Resident memory of the API process",
+    lambda: [({}, process_rss_bytes())]
+))
+
+@app.on_event("startup")
+async def start_job_queue():
+    job_queue.start()
+    # Optionally load heavy engines (e.g. Whisper) in the background before the first job
+    if WARMUP_MODALITIES:
+        asyncio.create_task(warm_up_modalities(WARMUP_MODALITIES))
+
+@app.on_event("shutdown")
+async def stop_job_queue():
+    await job_queue.stop()
+    cpu_pools.shutdown()
+    await job_store.close()
+
+@app.post("/repurpose", openapi_extra=upload_form_schema({
+    "file": {"type": "string", "format": "binary"},
+    "title": {"type": "string", "default": "Educational Content"},
+    "content_type": {"type": "string", "enum": ["file", "youtube"], "default": "file"},
+    "youtube_url": {"type": "string"},
+    "language_targets": {"type": "array", "items": {"type": "string"}},
+    "profile": {"type": "boolean", "default": False},
+}))
+async def create_repurpose_job(request: Request):
+    """Enhanced content repurposing endpoint supporting multiple file types and YouTube.
+    
+    The upload is streamed to disk, validated and queued; processing happens on
+    the job queue and progress can be followed through /jobs/{job_id}. With
+    profile=true the job runs under a sampling profiler, served from
+    /jobs/{job_id}/profile.
+    """
+    fields, uploads = await read_upload_form(request)
+    file = (uploads.get("file") or [None])[0]
+    title = form_value(fields, "title", "Educational Content")
+    content_type = form_value(fields, "content_type", "file")
+    youtube_url = form_value(fields, "youtube_url")
+    try:
+        # Validate input
+        profile = form_flag(fields, "profile")
+        if profile and not JOB_PROFILING_ENABLED:
+            raise HTTPException(status_code=400, detail="Job profiling is disabled on this server")
+        if profile and not JobProfiler.supported():
+            raise HTTPException(status_code=501, detail="Job profiling is not supported on this Python version")
+        languages = parse_language_targets(fields.get("language_targets"))
+        if content_type == "youtube":
+            if not youtube_url or not validate_youtube_url(youtube_url):
+                raise HTTPException(status_code=400, detail="Valid YouTube URL required")
+            queue_kind = "youtube"
+            payload = {"youtube_url": youtube_url}
+        else:
+            if not file:
+                raise HTTPException(status_code=400, detail="File required when content_type is 'file'")
+            queue_kind = get_file_type(file.filename)
+            payload = {"file_path": file.path, "file_hash": file.file_hash, "file_size": file.size, "filename": file.filename}
+    except BaseException:
+        remove_uploads(uploads)
+        raise
+    remove_uploads(uploads, keep=payload.get("file_path"))
+    
+    payload.update({"title": title, "content_type": content_type, "language_targets": languages, "profile": profile})
+    
+    job_ids = await queue_repurpose_jobs([(queue_kind, payload)])
+    return {"job_id": job_ids[0]}
+
+async def queue_repurpose_jobs(jobs: List[Tuple[str, Dict]]) -> List[str]:
+    """Create and queue jobs for (queue kind, payload) pairs; either all are queued or none"""
+    job_ids = [str(uuid.uuid4()) for _ in jobs]
+    try:
+        for job_id in job_ids:
+            await job_store.create({
+                "job_id": job_id,
+                "status": "processing",
+                "stage": "queued",
+                "progress": 0,
+                "result": None,
+                "error": None
+            })
+    except Exception:
+        await abandon_repurpose_jobs(job_ids, jobs, "Job could not be created")
+        raise
+    
+    # Capacity is checked and the jobs enqueued without awaiting in between, so
+    # no concurrent request can take the slots checked here
+    needed: Dict[str, int] = {}
+    for queue_kind, _ in jobs:
+        needed[queue_kind] = needed.get(queue_kind, 0) + 1
+    full = [kind for kind, count in needed.items() if job_queue.capacity(kind) < count]
+    if not full:
+        for job_id, (queue_kind, payload) in zip(job_ids, jobs):
+            job_queue.enqueue(queue_kind, job_id, {**payload, "queue_kind": queue_kind, "queued_at": time.time()})
+        return job_ids
+    
+    detail = f"Too many {', '.join(full)} jobs queued. Please try again later."
+    await abandon_repurpose_jobs(job_ids, jobs, detail)
+    raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=detail)
+
+async def abandon_repurpose_jobs(job_ids: List[str], jobs: List[Tuple[str, Dict]], error: str):
+    """Mark jobs that never reached the queue as failed and delete their uploads"""
+    for _, payload in jobs:
+        remove_file(payload.get("file_path"))
+    for job_id in job_ids:
+        try:
+            await job_store.update(job_id, status="failed", error=error)
+        except Exception as e:
+            print(f"Warning: could not mark job {job_id} as failed: {e}")
+
+@app.post("/repurpose/batch", openapi_extra=upload_form_schema({
+    "files": {"type": "array", "items": {"type": "string", "format": "binary"}},
+    "youtube_urls": {"type": "array", "items": {"type": "string"}},
+    "titles": {"type": "array", "items": {"type": "string"}},
+    "title": {"type": "string", "default": "Educational Content"},
+    "language_targets": {"type": "array", "items": {"type": "string"}},
+}))
+async def create_repurpose_batch(request: Request):
+    """Queue many files and/or YouTube URLs as one batch.
+    
+    Items with identical content (same file hash or URL) share one job. Titles
+    may be given per item, files first and then URLs; otherwise files are titled
+    after their filename and URLs get the batch title. Progress and results are
+    aggregated under /batches/{batch_id}.
+    """
+    fields, uploads = await read_upload_form(request, max_files=MAX_BATCH_ITEMS)
+    files = uploads.get("files", [])
+    try:
+        youtube_urls = [url.strip() for url in fields.get("youtube_urls", []) if url.strip()]
+        if not files and not youtube_urls:
+            raise HTTPException(status_code=400, detail="At least one file or YouTube URL required")
+        if len(files) + len(youtube_urls) > MAX_BATCH_ITEMS:
+            raise HTTPException(status_code=400, detail=f"A batch can contain at most {MAX_BATCH_ITEMS} items")
+        for url in youtube_urls:
+            if not validate_youtube_url(url):
+                raise HTTPException(status_code=400, detail=f"Invalid YouTube URL: {url}")
+        titles = fields.get("titles", [])
+        title = form_value(fields, "title", "Educational Content")
+        languages = parse_language_targets(fields.get("language_targets"))
+    except BaseException:
+        remove_uploads(uploads)
+        raise
+    remove_uploads({name: field for name, field in uploads.items() if name != "files"})
+    
+    items = []
+    jobs = []
+    first_index_by_input: Dict[str, int] = {}
+    try:
+        for index, source in enumerate([*files, *youtube_urls]):
+            item_title = titles[index] if index < len(titles) and titles[index].strip() else None
+            if isinstance(source, str):
+                input_key = f"youtube:{source}"
+                item = {"index": index, "youtube_url": source}
+                queue_kind = "youtube"
+                payload = {"youtube_url": source, "content_type": "youtube", "title": item_title or title}
+            else:
+                input_key = f"file:{source.file_hash}"
+                item = {"index": index, "filename": source.filename}
+                queue_kind = get_file_type(source.filename)
+                payload = {
+                    "file_path": source.path, "file_hash": source.file_hash, "file_size": source.size,
+                    "filename": source.filename, "content_type": "file",
+                    "title": item_title or os.path.splitext(os.path.basename(source.filename))[0],
+                }
+            
+            if input_key in first_index_by_input:
+                remove_file(payload.get("file_path"))
+                item["duplicate_of"] = first_index_by_input[input_key]
+            else:
+                first_index_by_input[input_key] = index
+                payload["language_targets"] = languages
+                item["job"] = len(jobs)
+                jobs.append((queue_kind, payload))
+            items.append(item)
+    except Exception:
+        remove_uploads(uploads)
+        raise
+    
+    job_ids = await queue_repurpose_jobs(jobs)
+    for item in items:
+        original = items[item["duplicate_of"]] if "duplicate_of" in item else item
+        item["job_id"] = job_ids[original["job"]]
+    items = [{name: value for name, value in item.items() if name != "job"} for item in items]
+    
+    # Batches are job store records, so they expire like their jobs without being served as jobs
+    batch_id = f"batch-{uuid.uuid4()}"
+    await job_store.save_record("batch", batch_id, {"title": title, "items": items})
+    return {"batch_id": batch_id, "items": items, "unique_jobs": len(job_ids)}
+
+async def get_batch_jobs(batch_id: str) -> Tuple[Dict, Dict[str, Optional[Dict]]]:
+    batch = await job_store.get_record("batch", batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    job_ids = list(dict.fromkeys(item["job_id"] for item in batch["items"]))
+    jobs = await asyncio.gather(*[job_store.get(job_id) for job_id in job_ids])
+    return batch, dict(zip(job_ids, jobs))
+
+def batch_status(jobs: Dict[str, Optional[Dict]]) -> Dict:
+    """Aggregate status over a batch's unique jobs"""
+    statuses = [job["status"] if job else "expired" for job in jobs.values()]
+    counts = {name: statuses.count(name) for name in ("processing", "completed", "failed", "expired")}
+    if counts["processing"]:
+        overall = "processing"
+    elif counts["completed"] == len(statuses):
+        overall = "completed"
+    elif counts["completed"]:
+        overall = "completed_with_errors"
+    else:
+        overall = "failed"
+    progress = [job["progress"] if job and job["status"] == "processing" else 100 for job in jobs.values()]
+    return {"status": overall, "progress": int(sum(progress) / len(progress)), "counts": counts}
+
+@app.get("/batches/{batch_id}")
+async def get_batch_status(batch_id: str):
+    """Aggregate progress of a batch, with each item's job status"""
+    batch, jobs = await get_batch_jobs(batch_id)
+    items = []
+    for item in batch["items"]:
+        job = jobs[item["job_id"]] or {}
+        items.append({
+            **item,
+            "status": job.get("status", "expired"),
+            "stage": job.get("stage"),
+            "progress": job.get("progress", 0),
+            "error": job.get("error"),
         })
+    return {"batch_id": batch_id, "title": batch["title"], **batch_status(jobs), "items": items}
+
+@app.get("/batches/{batch_id}/results")
+async def get_batch_results(batch_id: str):
+    """Results of a batch's finished items, plus all MCQs and flashcards combined.
     
-    return {"job_id": job_id}
+    Combined questions and cards are tagged with the title of the item they came from.
+    """
+    batch, jobs = await get_batch_jobs(batch_id)
+    items = []
+    combined = {"mcqs": [], "flashcards": []}
+    for item in batch["items"]:
+        job = jobs[item["job_id"]] or {}
+        result = job.get("result")
+        items.append({**item, "status": job.get("status", "expired"), "error": job.get("error"), "result": result})
+        if result and "duplicate_of" not in item:
+            for section in ("mcqs", "flashcards"):
+                combined[section].extend({**entry, "source": result["title"]} for entry in result.get(section, []))
+    return {"batch_id": batch_id, "title": batch["title"], **batch_status(jobs), "items": items, "combined": combined}
 
 # Keep existing endpoints
 @app.get("/jobs/{job_id}")
 async def get_job_status(job_id: str):
     """Get job status and progress"""
-    if job_id not in jobs_storage:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
-    return jobs_storage[job_id]
+    return job
+
+async def get_job_trace_record(job_id: str) -> Dict:
+    """Live trace of a job running in this process, else the trace saved when it finished"""
+    if job_id in active_traces:
+        return {"trace": active_traces[job_id].to_dict(), "profile": None, "running": True}
+    record = await job_store.get_record("trace", job_id)
+    if record is not None:
+        return {**record, "running": False}
+    if await job_store.get(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    # Queued, or running on another worker
+    return {"trace": None, "profile": None, "running": True}
+
+@app.get("/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str, format: str = "tree"):
+    """A job's span tree: queue waits, stages, worker-pool calls and Gemini requests.
+    
+    format=tree nests spans with durations in milliseconds; format=chrome returns
+    Chrome Trace Event JSON for chrome://tracing, Perfetto or speedscope.
+    """
+    if format not in ("tree", "chrome"):
+        raise HTTPException(status_code=400, detail="format must be 'tree' or 'chrome'")
+    record = await get_job_trace_record(job_id)
+    trace = record["trace"]
+    if trace is None:
+        raise HTTPException(status_code=409, detail="Job has not started yet")
+    if format == "chrome":
+        return JSONResponse(chrome_trace(trace))
+    return {
+        "job_id": job_id,
+        "running": record["running"],
+        "dropped_spans": trace["dropped_spans"],
+        "spans": trace_tree(trace),
+    }
+
+@app.get("/jobs/{job_id}/profile")
+async def get_job_profile(job_id: str, format: str = "json"):
+    """Sampling profile of a job submitted with profile=true, once it has finished.
+    
+    format=json lists the sampled stacks by count; format=folded returns one
+    "frame;frame;frame count" line per stack for flame graph tools.
+    """
+    if format not in ("json", "folded"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'folded'")
+    record = await get_job_trace_record(job_id)
+    if record["running"]:
+        raise HTTPException(status_code=409, detail="Profile is available once the job has finished")
+    profile = record.get("profile")
+    if profile is None:
+        raise HTTPException(status_code=404, detail="Job was not submitted with profile=true")
+    if format == "folded":
+        return PlainTextResponse("".join(f"{entry['stack']} {entry['samples']}\n" for entry in profile["stacks"]))
+    return {"job_id": job_id, **profile}
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job_events(job_id: str, request: Request):
+    """Server-sent events stream of a job's progress.
+    
+    The first event is a snapshot of the job's current state (without the
+    result). Stage, transcription-segment, generation and localization events
+    follow as they happen, and the stream ends with a completed or failed event.
+    """
+    subscription = await job_store.subscribe(job_id)
+    job = await job_store.get(job_id)
+    if job is None:
+        await subscription.close()
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    def format_event(event: Dict) -> str:
+        return f"event: {event['event']}\ndata: {json.dumps(event, ensure_ascii=False)}\n\n"
+    
+    async def event_stream():
+        try:
+            snapshot = {name: value for name, value in job.items() if name != "result"}
+            yield format_event({"event": "snapshot", **snapshot})
+            if job["status"] in ("completed", "failed"):
+                yield format_event({"event": job["status"], "job_id": job_id, "status": job["status"]})
+                return
+            
+            while not await request.is_disconnected():
+                event = await subscription.next_event(timeout=SSE_KEEPALIVE_SECONDS)
+                if event is None:
+                    yield ": keep-alive\n\n"
+                    continue
+                yield format_event(event)
+                if event["event"] in ("completed", "failed"):
+                    return
+        finally:
+            await subscription.close()
+    
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
 @app.get("/outputs/{job_id}")
 async def get_job_outputs(job_id: str):
     """Get completed job outputs"""
-    if job_id not in jobs_storage:
+    job = await job_store.get(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = jobs_storage[job_id]
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Job not completed yet")
     
     return job["result"]
 
+@app.get("/outputs/{job_id}/export/{export_format}")
+async def export_job_output(job_id: str, export_format: str, lang: Optional[str] = None):
+    """Download a completed job's result as json, csv (Google Forms MCQs) or jsonl.
+    
+    lang selects one of the job's localized versions. Exports are rendered on
+    first download, streamed in chunks and kept in memory for repeat downloads.
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Unknown export format. Available: {', '.join(EXPORT_FORMATS)}"
+        )
+    job = await job_store.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["status"] != "completed":
+        raise HTTPException(status_code=400, detail="Job not completed yet")
+    
+    result = job["result"]
+    if lang:
+        if lang not in result.get("localized", {}):
+            raise HTTPException(status_code=404, detail=f"No {lang} localization for this job")
+        content = {"title": result["title"], "content_source": result["content_source"],
+                   "language": lang, **result["localized"][lang]}
+    else:
+        content = result
+    
+    media_type, render, extension = EXPORT_FORMATS[export_format]
+    cache_key = content_hash(job_id, export_format, lang or "")
+    
+    async def stream_export():
+        cached = export_cache.get(cache_key)
+        if cached is not None:
+            for start in range(0, len(cached), EXPORT_CHUNK_SIZE):
+                yield cached[start:start + EXPORT_CHUNK_SIZE]
+            return
+        rendered = []
+        for chunk in render(content):
+            rendered.append(chunk)
+            yield chunk
+        export_cache.set(cache_key, b"".join(rendered))
+    
+    filename = re.sub(r"[^A-Za-z0-9._-]+", "-", result.get("title") or "content").strip("-") or "content"
+    if lang:
+        filename = f"{filename}-{lang}"
+    return StreamingResponse(
+        stream_export(),
+        media_type=media_type,
+        headers={"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+    )
+
+@app.get("/metrics")
+async def get_metrics():
+    """Prometheus text-format metrics: stage and Gemini latency histograms, errors, queues, caches, memory"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats")
+async def get_stats():
+    """Runtime statistics for the job queue, Gemini rate limiter and caches"""
+    return {
+        "job_queue": job_queue.stats(),
+        "rate_limiter": rate_limiter.stats(),
+        "extraction_cache": extraction_cache.stats(),
+        "result_cache": result_cache.stats(),
+        "llm_response_cache": llm_response_cache.stats() if llm_response_cache else None,
+    }
+
+@app.get("/ready")
+async def readiness_check():
+    """Readiness endpoint reporting which processing engines are loaded"""
+    ready = bool(job_queue.workers)
+    body = {"ready": ready, "engines": engine_status()}
+    if not ready:
+        return JSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content=body)
+    return body
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
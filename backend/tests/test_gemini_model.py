@@ -0,0 +1,33 @@
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import main
+
+
+class FakeGenerativeModel:
+    def __init__(self, model_name):
+        self.model_name = model_name
+    
+    async def generate_content_async(self, contents, **kwargs):
+        return SimpleNamespace(text=f"echo: {contents}")
+
+
+def test_lazy_model_loads_off_the_event_loop(monkeypatch):
+    configured_on = []
+    fake_genai = SimpleNamespace(
+        configure=lambda api_key: configured_on.append(threading.get_ident()),
+        GenerativeModel=FakeGenerativeModel,
+    )
+    monkeypatch.setattr(main, "genai", fake_genai)
+    lazy = main.LazyGeminiModel("test-model")
+    
+    async def run():
+        loop_thread = threading.get_ident()
+        response = await main.rate_limiter._generate(lazy, "hi")
+        return loop_thread, response.text
+    
+    loop_thread, text = asyncio.run(run())
+    assert text == "echo: hi"
+    assert lazy.loaded
+    assert configured_on and configured_on[0] != loop_thread
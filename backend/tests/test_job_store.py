@@ -0,0 +1,115 @@
+"""Contract tests run against every JobStore implementation.
+
+Redis is covered through fakeredis, and against a real server as well when
+TEST_REDIS_URL is set.
+"""
+import asyncio
+import os
+
+import pytest
+
+import main
+
+
+def memory_store():
+    return main.InMemoryJobStore(ttl=60)
+
+
+def fake_redis_store():
+    fakeredis = pytest.importorskip("fakeredis")
+    return main.RedisJobStore(fakeredis.aioredis.FakeRedis(), ttl=60, prefix="test:job:",
+                              record_prefix="test:record:")
+
+
+def real_redis_store():
+    url = os.getenv("TEST_REDIS_URL")
+    if not url:
+        pytest.skip("TEST_REDIS_URL is not set")
+    aioredis = pytest.importorskip("redis.asyncio")
+    return main.RedisJobStore(aioredis.Redis.from_url(url), ttl=60, prefix="test:job:",
+                              record_prefix="test:record:")
+
+
+@pytest.fixture(params=[memory_store, fake_redis_store, real_redis_store],
+                ids=["memory", "fakeredis", "redis"])
+def with_store(request):
+    def run(test):
+        async def go():
+            store = request.param()
+            try:
+                return await test(store)
+            finally:
+                await store.close()
+        return asyncio.run(go())
+    return run
+
+
+def new_job(job_id):
+    return {"job_id": job_id, "status": "queued", "stage": "queued", "progress": 0,
+            "result": None, "error": None}
+
+
+def test_create_and_get(with_store):
+    async def test(store):
+        await store.create(new_job("a"))
+        assert await store.get("a") == new_job("a")
+        assert await store.get("missing") is None
+    with_store(test)
+
+
+def test_update_merges_fields_and_round_trips_results(with_store):
+    async def test(store):
+        await store.create(new_job("a"))
+        result = {"summary": "Short summary", "mcqs": [{"question": "Why?", "options": ["A", "B"]}]}
+        await store.update("a", status="completed", progress=100, result=result)
+        job = await store.get("a")
+        assert job["status"] == "completed"
+        assert job["progress"] == 100
+        assert job["stage"] == "queued"
+        assert job["result"] == result
+    with_store(test)
+
+
+def test_update_of_missing_job_does_not_create_it(with_store):
+    async def test(store):
+        await store.update("missing", status="failed")
+        assert await store.get("missing") is None
+    with_store(test)
+
+
+def test_delete(with_store):
+    async def test(store):
+        await store.create(new_job("a"))
+        await store.delete("a")
+        assert await store.get("a") is None
+        await store.delete("a")
+    with_store(test)
+
+
+def test_subscribers_receive_events_published_after_subscribing(with_store):
+    async def test(store):
+        await store.publish("a", {"event": "before"})
+        subscription = await store.subscribe("a")
+        other = await store.subscribe("b")
+        try:
+            await store.publish("a", {"event": "progress", "progress": 20})
+            await store.publish("a", {"event": "completed"})
+            assert await subscription.next_event(1) == {"event": "progress", "progress": 20}
+            assert await subscription.next_event(1) == {"event": "completed"}
+            assert await subscription.next_event(0.05) is None
+            assert await other.next_event(0.05) is None
+        finally:
+            await subscription.close()
+            await other.close()
+    with_store(test)
+
+
+def test_records_are_kept_apart_from_jobs(with_store):
+    async def test(store):
+        batch = {"batch_id": "a", "job_ids": ["j1", "j2"]}
+        await store.save_record("batch", "a", batch)
+        assert await store.get_record("batch", "a") == batch
+        assert await store.get_record("batch", "missing") is None
+        assert await store.get_record("other", "a") is None
+        assert await store.get("a") is None
+    with_store(test)
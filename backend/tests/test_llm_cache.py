@@ -0,0 +1,47 @@
+import asyncio
+
+import main
+
+
+def test_waiter_takes_over_when_owner_is_cancelled():
+    async def run():
+        cache = main.LLMResponseCache(main.MemoryLRUCache(max_entries=10))
+        calls = []
+        
+        async def compute():
+            calls.append(1)
+            if len(calls) == 1:
+                await asyncio.sleep(10)
+            return "answer"
+        
+        owner = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+        waiter = asyncio.create_task(cache.get_or_compute("key", compute))
+        await asyncio.sleep(0)
+        owner.cancel()
+        return await asyncio.wait_for(waiter, 1), len(calls)
+    
+    assert asyncio.run(run()) == ("answer", 2)
+
+
+def test_worker_marks_crashed_job_failed(monkeypatch):
+    async def run():
+        store = main.InMemoryJobStore(ttl=60)
+        monkeypatch.setattr(main, "job_store", store)
+        
+        async def crash(job_id, payload):
+            raise RuntimeError("boom")
+        
+        monkeypatch.setattr(main, "generate_job_content", crash)
+        await store.create({"job_id": "job", "status": "processing", "stage": "generating",
+                            "progress": 30, "result": None, "error": None})
+        queue = main.JobQueue({"generation": 1})
+        queue.start()
+        queue.enqueue("generation", "job", {})
+        await asyncio.wait_for(queue.queues["generation"].join(), 1)
+        await queue.stop()
+        return await store.get("job")
+    
+    job = asyncio.run(run())
+    assert job["status"] == "failed"
+    assert job["error"] == "boom"
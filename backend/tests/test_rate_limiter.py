@@ -0,0 +1,58 @@
+import asyncio
+
+import pytest
+
+import main
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.real_sleep = asyncio.sleep
+    
+    def monotonic(self):
+        return self.now
+    
+    async def sleep(self, seconds):
+        self.now += max(seconds, 1e-6)
+        await self.real_sleep(0)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    fake = FakeClock()
+    monkeypatch.setattr(main.time, "monotonic", fake.monotonic)
+    monkeypatch.setattr(main.asyncio, "sleep", fake.sleep)
+    return fake
+
+
+def max_in_window(times, window):
+    return max(sum(1 for t in times if start <= t < start + window) for start in times)
+
+
+@pytest.mark.parametrize("burst", [None, 1, 3, 5])
+def test_never_more_than_rpm_in_any_minute(clock, burst):
+    async def run():
+        bucket = main.TokenBucket(10, burst=burst)
+        granted = []
+        
+        async def request():
+            await bucket.acquire(1)
+            granted.append(clock.now)
+        
+        await asyncio.gather(*[request() for _ in range(40)])
+        return granted
+    
+    granted = asyncio.run(run())
+    assert len(granted) == 40
+    assert max_in_window(granted, 60.0) <= 10
+
+
+def test_refunded_tokens_do_not_exceed_the_bucket(clock):
+    async def run():
+        bucket = main.TokenBucket(1000, burst=100)
+        await bucket.acquire(100)
+        bucket.adjust(500)
+        return bucket.tokens
+    
+    assert asyncio.run(run()) == 100
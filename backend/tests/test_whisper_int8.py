@@ -0,0 +1,30 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+whisper = pytest.importorskip("whisper")
+
+import main
+from whisper.model import ModelDimensions, Whisper
+
+
+def tiny_whisper():
+    dims = ModelDimensions(
+        n_mels=80, n_audio_ctx=16, n_audio_state=32, n_audio_head=2, n_audio_layer=1,
+        n_vocab=100, n_text_ctx=8, n_text_state=32, n_text_head=2, n_text_layer=1,
+    )
+    return Whisper(dims).eval()
+
+
+def test_int8_quantizes_whisper_linear_layers():
+    model = main.quantize_whisper_int8(tiny_whisper())
+    
+    quantized = [m for m in model.modules() if isinstance(m, torch.ao.nn.quantized.dynamic.Linear)]
+    assert quantized
+    assert not any(type(m) in (torch.nn.Linear, whisper.model.Linear) for m in model.modules())
+
+
+def test_int8_model_still_runs():
+    model = main.quantize_whisper_int8(tiny_whisper())
+    
+    logits = model(torch.randn(1, 80, 32), torch.tensor([[1, 2]]))
+    assert logits.shape == (1, 2, 100)
@@ -0,0 +1,20 @@
+import main
+
+URL = "https://www.youtube.com/watch?v=dQw4w9WgXcQ"
+
+
+def test_key_is_stable_for_the_same_settings():
+    assert main.youtube_extraction_key(URL) == main.youtube_extraction_key(URL)
+
+
+def test_key_changes_with_ingest_mode(monkeypatch):
+    captions = main.youtube_extraction_key(URL)
+    monkeypatch.setattr(main, "YOUTUBE_INGEST_MODE", "audio")
+    assert main.youtube_extraction_key(URL) != captions
+
+
+def test_key_changes_with_caption_languages(monkeypatch):
+    monkeypatch.setattr(main, "YOUTUBE_CAPTION_LANGUAGES", ["en"])
+    english = main.youtube_extraction_key(URL)
+    monkeypatch.setattr(main, "YOUTUBE_CAPTION_LANGUAGES", ["de", "en"])
+    assert main.youtube_extraction_key(URL) != english
@@ -51,9 +51,11 @@ interface JobResult {
       flashcards: Flashcard[];
     };
   };
+  // Download paths, rendered on demand by the API
   exports: {
-    google_forms_csv: string;
-    full_json: string;
+    json: string;
+    csv: string;
+    jsonl: string;
   };
   file_hash?: string;
 }
@@ -62,6 +64,7 @@ interface JobStatus {
   job_id: string;
   status: 'processing' | 'completed' | 'failed';
   progress: number;
+  stage?: string;
   result?: JobResult;
   error?: string;
 }
@@ -350,7 +353,7 @@ function App() {
 
       const data = await response.json();
       setJobId(data.job_id);
-      pollJobStatus(data.job_id);
+      followJobEvents(data.job_id);
     } catch (error) {
       console.error('Error starting job:', error);
       setUploadError(error instanceof Error ? error.message : 'Failed to start processing');
@@ -358,6 +361,47 @@ function App() {
     }
   };
 
+  // Follow progress over server-sent events; fall back to polling if the stream is unavailable
+  const followJobEvents = (jobId: string) => {
+    if (typeof EventSource === 'undefined') {
+      pollJobStatus(jobId);
+      return;
+    }
+
+    const source = new EventSource(`${API_BASE}/jobs/${jobId}/events`);
+    let finished = false;
+
+    const onProgress = (event: MessageEvent) => {
+      const data = JSON.parse(event.data);
+      setJobStatus(prev => ({
+        ...prev,
+        job_id: jobId,
+        status: 'processing',
+        ...(data.progress !== undefined ? { progress: data.progress } : {}),
+        ...(data.stage !== undefined ? { stage: data.stage } : {}),
+      }));
+    };
+
+    ['snapshot', 'progress', 'stage', 'stage_completed'].forEach(name =>
+      source.addEventListener(name, onProgress as EventListener)
+    );
+
+    ['completed', 'failed'].forEach(name =>
+      source.addEventListener(name, () => {
+        finished = true;
+        source.close();
+        // The stream carries progress only; fetch the final job for its result or error
+        pollJobStatus(jobId);
+      })
+    );
+
+    source.onerror = () => {
+      if (finished) return;
+      source.close();
+      pollJobStatus(jobId);
+    };
+  };
+
   const pollJobStatus = async (jobId: string) => {
     try {
       const response = await fetch(`${API_BASE}/jobs/${jobId}`);
@@ -381,44 +425,17 @@ function App() {
     }
   };
 
-  const downloadCSV = () => {
-    if (!jobStatus?.result?.exports?.google_forms_csv) return;
-
-    try {
-      const blob = new Blob([jobStatus.result.exports.google_forms_csv], {
-        type: 'text/csv;charset=utf-8;'
-      });
-      const url = URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href = url;
-      a.download = `${title || 'quiz'}-google-forms.csv`;
-      document.body.appendChild(a);
-      a.click();
-      document.body.removeChild(a);
-      URL.revokeObjectURL(url);
-    } catch (error) {
-      console.error('Error downloading CSV:', error);
-    }
-  };
-
-  const downloadJSON = () => {
-    if (!jobStatus?.result?.exports?.full_json) return;
-
-    try {
-      const blob = new Blob([jobStatus.result.exports.full_json], {
-        type: 'application/json;charset=utf-8;'
-      });
-      const url = URL.createObjectURL(blob);
-      const a = document.createElement('a');
-      a.href = url;
-      a.download = `${title || 'content'}-full-export.json`;
-      document.body.appendChild(a);
-      a.click();
-      document.body.removeChild(a);
-      URL.revokeObjectURL(url);
-    } catch (error) {
-      console.error('Error downloading JSON:', error);
-    }
+  const downloadExport = (format: 'json' | 'csv' | 'jsonl') => {
+    const path = jobStatus?.result?.exports?.[format];
+    if (!path) return;
+
+    // The API streams the file with a Content-Disposition filename; localized exports for the active language
+    const query = activeLanguage !== 'en' ? `?lang=${encodeURIComponent(activeLanguage)}` : '';
+    const a = document.createElement('a');
+    a.href = `${API_BASE}${path}${query}`;
+    document.body.appendChild(a);
+    a.click();
+    document.body.removeChild(a);
   };
 
   const getCurrentContent = () => {
@@ -795,14 +812,14 @@ function App() {
                   
                   <div className="flex flex-wrap gap-3">
                     <button
-                      onClick={downloadCSV}
+                      onClick={() => downloadExport('csv')}
                       className="flex items-center px-4 py-2 bg-gradient-to-r from-green-600 to-emerald-600 text-white rounded-xl hover:from-green-700 hover:to-emerald-700 transition-all duration-300 transform hover:scale-105 shadow-lg"
                     >
                       <Download className="h-4 w-4 mr-2" />
                       Google Forms CSV
                     </button>
                     <button
-                      onClick={downloadJSON}
+                      onClick={() => downloadExport('json')}
                       className="flex items-center px-4 py-2 bg-gradient-to-r from-purple-600 to-violet-600 text-white rounded-xl hover:from-purple-700 hover:to-violet-700 transition-all duration-300 transform hover:scale-105 shadow-lg"
                     >
                       <Download className="h-4 w-4 mr-2" />